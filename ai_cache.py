@@ -0,0 +1,153 @@
+import hashlib
+import json
+import numbers
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# ===================== إعدادات الكاش =====================
+CACHE_PATH = os.getenv("AI_CACHE_PATH", ".ai_cache.sqlite3")
+CACHE_TTL = int(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600))            # بالثواني
+CACHE_MAX_BYTES = int(os.getenv("AI_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+CACHE_BUCKET = os.getenv("AI_CACHE_BUCKET", "day")                     # day | week | month | none
+
+
+def date_bucket(bucket=None, now=None):
+    """تحويل تاريخ اليوم لـ "سلة" زمنية (يوم/أسبوع/شهر) تدخل في مفتاح الكاش"""
+    bucket = (bucket or CACHE_BUCKET).lower()
+    now = now or datetime.today()
+    if bucket == "day":
+        return now.strftime("%Y-%m-%d")
+    if bucket == "week":
+        return now.strftime("%G-W%V")
+    if bucket == "month":
+        return now.strftime("%Y-%m")
+    return ""
+
+
+def _canonical(value):
+    """شكل ثابت للقيمة: مسافات موحدة للنصوص وتقريب للأرقام"""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, numbers.Number):
+        return round(float(value), 4)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return str(value)
+
+
+def make_cache_key(kind, bucket=None, **inputs):
+    """مفتاح الكاش = hash لمدخلات البرومبت بعد توحيدها + السلة الزمنية"""
+    payload = {
+        "kind": kind,
+        "bucket": date_bucket(bucket),
+        "inputs": _canonical(inputs),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AICache:
+    """كاش SQLite دائم لردود AI: TTL + إخلاء LRU محدود بعدد البايتات + عدادات hit/miss"""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        size = len(raw.encode("utf-8"))
+        if self.max_bytes and size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, raw, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """حذف الأقدم استخدامًا (LRU) لحد ما الحجم الكلي يرجع تحت الحد"""
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+
+# كاش واحد مشترك على مستوى البروسيس (الموديول مش بيتعاد تحميله مع كل rerun)
+ai_cache = AICache()
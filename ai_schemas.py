@@ -0,0 +1,82 @@
+# ===================== Schemas لردود الـ AI (Structured Output) =====================
+# بنفس صيغة response_schema في Gemini (OpenAPI subset)، والـ validator المحلي تحت بيفحص نفس الـ schema.
+
+_NUMBER = {"type": "NUMBER"}
+_STRING = {"type": "STRING"}
+_STRING_LIST = {"type": "ARRAY", "items": _STRING}
+
+BENCHMARKS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"CPA": _NUMBER, "CR": _NUMBER, "ROAS": _NUMBER},
+    "required": ["CPA", "CR", "ROAS"],
+}
+
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "MarketBenchmarks": BENCHMARKS_SCHEMA,
+        "Analysis": _STRING_LIST,
+        "Recommendations": _STRING_LIST,
+    },
+    "required": ["MarketBenchmarks", "Analysis", "Recommendations"],
+}
+
+ANALYSIS_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": dict(ANALYSIS_SCHEMA["properties"], id=_STRING),
+        "required": ["id"] + ANALYSIS_SCHEMA["required"],
+    },
+}
+
+MARKET_REPORT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "MarketSize": _STRING,
+        "GrowthRate": _NUMBER,
+        "TopCompetitors": _STRING_LIST,
+        "SWOT": {
+            "type": "OBJECT",
+            "properties": {
+                "Strengths": _STRING_LIST,
+                "Weaknesses": _STRING_LIST,
+                "Opportunities": _STRING_LIST,
+                "Threats": _STRING_LIST,
+            },
+            "required": ["Strengths", "Weaknesses", "Opportunities", "Threats"],
+        },
+        "Recommendations": _STRING_LIST,
+    },
+    "required": ["MarketSize", "GrowthRate", "TopCompetitors", "SWOT", "Recommendations"],
+}
+
+
+def validate(data, schema, path="$"):
+    """
+    فحص سريع للرد على الـ schema؛ بيرجع قائمة أخطاء (فاضية = سليم).
+    الأرقام بتتقبل كنص كمان ("2.5%") عشان ردود الـ backends اللي من غير structured output،
+    والتحويل الفعلي بيحصل بعد كده بـ _to_float.
+    """
+    kind = schema["type"]
+    if kind == "OBJECT":
+        if not isinstance(data, dict):
+            return [f"{path}: المفروض object"]
+        errors = [f"{path}.{key}: ناقص" for key in schema.get("required", []) if key not in data]
+        for key, sub in schema.get("properties", {}).items():
+            if key in data:
+                errors.extend(validate(data[key], sub, f"{path}.{key}"))
+        return errors
+    if kind == "ARRAY":
+        if not isinstance(data, list):
+            return [f"{path}: المفروض array"]
+        errors = []
+        for i, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+        return errors
+    if kind == "STRING":
+        return [] if isinstance(data, str) else [f"{path}: المفروض نص"]
+    if kind in ("NUMBER", "INTEGER"):
+        ok = isinstance(data, (int, float, str)) and not isinstance(data, bool)
+        return [] if ok else [f"{path}: المفروض رقم"]
+    return []
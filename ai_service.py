@@ -0,0 +1,428 @@
+import json
+from datetime import datetime
+
+from ai_cache import ai_cache, make_cache_key
+from ai_schemas import ANALYSIS_BATCH_SCHEMA, ANALYSIS_SCHEMA, BENCHMARKS_SCHEMA, MARKET_REPORT_SCHEMA, validate
+from ai_stream import iter_leaves, stream_generate
+from arabic_text import canonical_field, display_field
+from benchmark_table import lookup as lookup_local_benchmarks
+from llm_backend import get_backend
+from resilience import AI_HEDGE_AFTER, call_with_retries, resilient_stream
+from tracing import add_attrs, span
+
+# ===================== دوال مساعدة عامة =====================
+def _safe_parse_json(raw_text: str):
+    """تنظيف وتحويل رد AI إلى JSON صالح"""
+    if not isinstance(raw_text, str):
+        return None
+    txt = raw_text.strip()
+    if txt.startswith("```"):
+        txt = txt.strip("`")
+        if txt.lower().startswith("json"):
+            txt = txt[4:].strip()
+    try:
+        return json.loads(txt)
+    except Exception:
+        return None
+
+class AIResponseError(ValueError):
+    """الموديل رد بس الرد مش JSON مفهوم"""
+
+def _generate(prompt, on_item=None, schema=None):
+    """
+    طلب واحد للموديل (stream لو on_item موجودة) بمهلة و retries و circuit breaker،
+    جوه span عشان زمنه وتوكنزه يظهروا في التتبع. schema = شكل الرد (structured output).
+    الطلبات التفاعلية (stream) بس اللي ممكن تتكرر hedged عشان ما تضاعفش تكلفة الـ BULK.
+    """
+    with span("llm.generate", streaming=on_item is not None, prompt_chars=len(prompt)):
+        backend = get_backend()
+        if on_item is None:
+            return call_with_retries(lambda: backend.generate(prompt, schema=schema))
+        chunks = resilient_stream(lambda: backend.stream(prompt, schema=schema), hedge_after=AI_HEDGE_AFTER)
+        return stream_generate(chunks, on_item)
+
+def _parse_validated(raw, schema):
+    """JSON الرد بعد فحصه على الـ schema؛ أي رد بايظ بيطلع AIResponseError بدل أصفار"""
+    with span("json.parse"):
+        data = _safe_parse_json(raw)
+        errors = validate(data, schema) if data is not None else ["الرد مش JSON"]
+    if errors:
+        raise AIResponseError(f"رد غير مفهوم من AI ({errors[0]})")
+    return data
+
+def _to_float(x, default=0.0):
+    try:
+        if isinstance(x, str):
+            x = x.replace("%", "").strip()
+        return float(x)
+    except Exception:
+        return default
+
+# ===================== Benchmarks كلاسيكية + تحليل نصي لتبويبات 3 و 4 =====================
+def resolve_benchmarks(category: str):
+    """
+    Benchmarks السوق السعودي (CPA, CR, ROAS) لمجال من 3 مستويات بالترتيب:
+    جدول الـ Benchmarks المحلي ← الكاش ← الموديل (بس لو المستويين اللي قبله ما لقوش).
+    بترجع (النتيجة, المستوى اللي جاوب): "table" أو "cache" أو "model".
+    """
+    with span("benchmarks.resolve"):
+        result, tier = known_benchmarks(category)
+        if result is None:
+            result, tier = _benchmarks_from_model(category, _benchmarks_cache_key(category)), "model"
+        add_attrs(tier=tier)
+    return result, tier
+
+def _benchmarks_cache_key(category):
+    # نفس المجال بكتابات مختلفة (أ/ا، ة/ه، لاتيني/عربي) = نفس النتيجة
+    return make_cache_key("benchmarks", category=canonical_field(category))
+
+def known_benchmarks(category):
+    """Benchmarks المجال من المستويات اللي مش محتاجة طلب AI (الجدول ثم الكاش)؛ (None, None) لو مش موجودة"""
+    local = lookup_local_benchmarks(category)
+    if local is not None:
+        return local, "table"
+    cached = ai_cache.get(_benchmarks_cache_key(category))
+    if cached is not None:
+        return cached, "cache"
+    return None, None
+
+def get_benchmarks_from_ai(category: str):
+    """تجلب Benchmarks تقديرية للسوق السعودي (CPA, CR, ROAS) بأرقام آمنة (من أقرب مستوى متاح)"""
+    return resolve_benchmarks(category)[0]
+
+def _benchmarks_from_model(category, cache_key):
+    """طلب الـ Benchmarks من الموديل؛ النتيجة بتتخزن في الكاش لنفس المجال ونفس السلة الزمنية"""
+
+    prompt = f"""
+    اكتب فقط JSON صالح (بدون أي نص إضافي) لمتوسط مؤشرات السوق السعودي لمجال "{display_field(category)}".
+    استخدم هذه البنية:
+    {{
+      "CPA": 0.0,
+      "CR": 0.0,
+      "ROAS": 0.0
+    }}
+    جميع القيم أرقام (بدون وحدات/رموز).
+    واكتب بالعربية لو فيه أسماء حقول إضافية.
+    """
+    data = _parse_validated(_generate(prompt, schema=BENCHMARKS_SCHEMA), BENCHMARKS_SCHEMA)
+    # تحويل آمن
+    result = {
+        "CPA": _to_float(data.get("CPA", 0)),
+        "CR": _to_float(data.get("CR", 0)),
+        "ROAS": _to_float(data.get("ROAS", 0)),
+    }
+    # ما نخزنش رد فاشل في الكاش
+    if data:
+        ai_cache.set(cache_key, result)
+    return result
+
+def analyze(client, market):
+    """
+    مقارنة سريعة بين أداء العميل والسوق.
+    تتوقع مفاتيح client: CPA(optional), CR, ROAS, NetProfit/ProfitMargin(optional)
+    """
+    analysis = []
+    # CPA (اختياري)
+    if "CPA" in client and client["CPA"] is not None:
+        if client["CPA"] > market["CPA"]:
+            analysis.append(f"🔴 CPA عندك = {client['CPA']:.2f} ريال أعلى من السوق ({market['CPA']:.2f} ريال).")
+        else:
+            analysis.append(f"🟢 CPA عندك = {client['CPA']:.2f} ريال أفضل من السوق ({market['CPA']:.2f} ريال).")
+
+    # CR
+    analysis.append(f"CR = {client['CR']*100:.2f}% مقابل السوق {market['CR']*100:.2f}%.")
+
+    # ROAS
+    if client["ROAS"] >= market["ROAS"]:
+        analysis.append(f"🟢 ROAS = {client['ROAS']:.2f}x أفضل من السوق ({market['ROAS']:.2f}x).")
+    else:
+        analysis.append(f"🔴 ROAS = {client['ROAS']:.2f}x أقل من السوق ({market['ROAS']:.2f}x).")
+
+    # ربحية (اختياري)
+    if "NetProfit" in client:
+        analysis.append(f"صافي الربح/طلب (ريال) = {client['NetProfit']:.2f}")
+    elif "ProfitMargin" in client:
+        analysis.append(f"هامش الربح/طلب (ريال) = {client['ProfitMargin']:.2f}")
+
+    return "\n".join(analysis)
+
+# ===================== دوال تحليـل الدروب شوبينج (كودك) =====================
+def clean_text_ar(text: str) -> str:
+    """تنظيف النص: حذف أي إنجليزي وتصحيح المسافات"""
+    import re
+    # شيل أي حروف إنجليزية
+    text = re.sub(r'[A-Za-z]', '', text)
+    # تصحيح المسافات المكررة
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+def _analysis_cache_key(field, CPA, CR, ROAS, orders, visits, reference=None):
+    """
+    المفتاح بنفس تنسيق الأرقام اللي بيشوفه الموديل في البرومبت، ومنها المؤشرات المرجعية لو اتبعتت:
+    تحليل اتعمل قبل تسخين الكاش (أو بأرقام جدول قديمة) ما يترجعش جنب Benchmarks غير اللي اتقارن بيها.
+    """
+    inputs = {
+        "field": canonical_field(field),
+        "CPA": f"{CPA:.2f}",
+        "CR": f"{CR*100:.2f}",
+        "ROAS": f"{ROAS:.2f}",
+        "orders": orders,
+        "visits": visits,
+    }
+    if reference is not None:
+        inputs["reference"] = reference
+    return make_cache_key("analysis", **inputs)
+
+def _normalize_analysis(data):
+    """تطبيع Benchmarks وتنظيف نصوص التحليل والتوصيات"""
+    if "MarketBenchmarks" in data and isinstance(data["MarketBenchmarks"], dict):
+        mb = data["MarketBenchmarks"]
+        data["MarketBenchmarks"] = {
+            "CPA": _to_float(mb.get("CPA", 0)),
+            "CR": _to_float(mb.get("CR", 0)),
+            "ROAS": _to_float(mb.get("ROAS", 0)),
+        }
+    else:
+        data["MarketBenchmarks"] = {"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}
+
+    # تنظيف النصوص من أي إنجليزي أو لخبطة
+    data["Analysis"] = [clean_text_ar(a) for a in data.get("Analysis", []) if isinstance(a, str)]
+    data["Recommendations"] = [clean_text_ar(r) for r in data.get("Recommendations", []) if isinstance(r, str)]
+    return data
+
+def _reference_benchmarks(field):
+    """
+    المؤشرات المرجعية للمجال (الجدول أو الكاش المتسخن) بنفس التقريب اللي الموديل بيشوفه في البرومبت:
+    (dict أو None, المستوى). بتتحسب مرة واحدة لكل طلب وتتبعت للبرومبت ومفتاح الكاش والعرض مع بعض.
+    """
+    known, tier = known_benchmarks(field)
+    if known is None:
+        return None, None
+    reference = {"CPA": round(known["CPA"], 2), "CR": round(known["CR"], 4), "ROAS": round(known["ROAS"], 2)}
+    return reference, tier
+
+def _reference_benchmarks_text(reference):
+    """لو فيه مؤشرات مرجعية الموديل بيقارن بنفس الأرقام اللي هتتعرض"""
+    if reference is None:
+        return ""
+    return (
+        f"مؤشرات السوق المرجعية لهذا المجال (استخدمها كما هي في MarketBenchmarks): "
+        f"CPA = {reference['CPA']:.2f} ريال، CR = {reference['CR']*100:.2f}%، ROAS = {reference['ROAS']:.2f}x"
+    )
+
+def _reference_benchmarks_line(reference):
+    text = _reference_benchmarks_text(reference)
+    return text + "\n" if text else ""
+
+def _reference_benchmarks_item(reference):
+    """نفس المؤشرات المرجعية كجزء من سطر العميل في البرومبت المجمّع"""
+    text = _reference_benchmarks_text(reference)
+    return f" | {text}" if text else ""
+
+def _with_known_benchmarks(data, reference, tier):
+    """
+    التحليل اتعمل بالمؤشرات المرجعية دي (هي جزء من مفتاح الكاش)، فبتتعرض هي بدل تقدير الموديل؛
+    BenchmarkSource بيقول مين جاوب.
+    """
+    if reference is None:
+        return dict(data, BenchmarkSource=data.get("BenchmarkSource", "model"))
+    return dict(data, MarketBenchmarks=dict(reference), BenchmarkSource=tier)
+
+def build_analysis_prompt(field, CPA, CR, ROAS, orders, visits, reference=None):
+    """برومبت تحليل عميل واحد (مستخدم في الطلبات المباشرة وفي ملفات الـ Batch)؛ reference من _reference_benchmarks"""
+    today = datetime.today().strftime("%Y-%m-%d")
+
+    prompt = f"""
+    انت خبير تسويق في السعودية.
+    ✅ مسموح فقط باللغة العربية.
+    ❌ ممنوع استخدام أي كلمة أو جملة باللغة الإنجليزية.
+    ✅ إذا ذكرت الاختصارات CPA أو CR أو ROAS، يجب أن تكتب بهذا الشكل:
+    - تكلفة جذب العميل (CPA)
+    - معدل التحويل (CR)
+    - عائد الإنفاق الإعلاني (ROAS)
+    ✅ اجعل الرد منظم في شكل قائمة مرقمة (1، 2، 3 ...)، بجُمل قصيرة ومباشرة.
+
+    التاريخ: {today}
+    المجال: {display_field(field)}
+
+    بيانات العميل:
+    - تكلفة جذب العميل (CPA) = {CPA:.2f} ريال
+    - معدل التحويل (CR) = {CR*100:.2f}%
+    - عائد الإنفاق الإعلاني (ROAS) = {ROAS:.2f}x
+    - الأوردرات = {orders}
+    - الزيارات = {visits}
+    {_reference_benchmarks_line(reference)}
+    اعطني تحليل كامل يتضمن:
+    1. مؤشرات السوق السعودي الحالية (CPA, CR, ROAS).
+    2. مقارنة بين بيانات العميل والسوق (أفضل ✅ – أضعف ⚠ – غير منطقي ❌) ويُعرض بشكل مرقم (1، 2، 3).
+    3. تحذيرات إذا كانت البيانات غير منطقية (مثلاً CR > 20% أو ROAS > 10x أو زيارات < 100) وتكون أيضًا مرقمة.
+    4. توصيات عملية قصيرة ومباشرة وتكون في شكل قائمة مرقمة.
+
+    النتيجة لازم تكون JSON فقط بالصيغة:
+    {{
+    "MarketBenchmarks": {{"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}},
+    "Analysis": ["1. ...", "2. ...", "3. ..."],
+    "Recommendations": ["1. ...", "2. ...", "3. ..."]
+    }}
+    """
+    return prompt
+
+def parse_analysis_response(raw):
+    """تحويل نص رد AI لتحليل منظم (Benchmarks أرقام + نصوص عربية نظيفة)؛ الرد البايظ بيطلع AIResponseError"""
+    return _normalize_analysis(_parse_validated(raw, ANALYSIS_SCHEMA))
+
+def get_ai_analysis(field, CPA, CR, ROAS, orders, visits, on_item=None):
+    """
+    جلب Benchmarks السوق + التحليل مباشرة من AI (بالعربية فقط ومنظم)
+    لو on_item موجودة الرد بيتقرأ stream وبتتنادي on_item(path, value) لكل قيمة أول ما تكمل.
+    """
+    reference, tier = _reference_benchmarks(field)
+    cache_key = _analysis_cache_key(field, CPA, CR, ROAS, orders, visits, reference)
+    cached = ai_cache.get(cache_key)
+    if cached is not None:
+        cached = _with_known_benchmarks(cached, reference, tier)
+        if on_item is not None:
+            for path, value in iter_leaves(cached):
+                on_item(path, value)
+        return cached
+
+    if on_item is not None and reference is not None:
+        # المؤشرات المرجعية بتظهر فورًا، وأرقام الموديل للـ Benchmarks ما بتتعرضش
+        for key in ("CPA", "CR", "ROAS"):
+            on_item(("MarketBenchmarks", key), reference[key])
+        show_item = on_item
+
+        def on_item(path, value):
+            if path[0] != "MarketBenchmarks":
+                show_item(path, value)
+
+    with span("prompt.build"):
+        prompt = build_analysis_prompt(field, CPA, CR, ROAS, orders, visits, reference)
+    data = parse_analysis_response(_generate(prompt, on_item, schema=ANALYSIS_SCHEMA))
+    if not (data["Analysis"] or data["Recommendations"]):
+        # صف BULK بيتسجل فيه خطأ بدل تحليل فاضي
+        raise AIResponseError("رد غير مفهوم من AI")
+    ai_cache.set(cache_key, data)
+    return _with_known_benchmarks(data, reference, tier)
+
+def get_ai_analysis_batch(clients):
+    """
+    تحليل عدة عملاء في طلب AI واحد.
+    clients: قائمة dicts فيها id, field, CPA, CR, ROAS, orders, visits
+    بترجع dict من id للتحليل؛ أي عميل رده ناقص أو بايظ بيتحلل لوحده بـ get_ai_analysis،
+    ولو فشل كمان قيمته بتبقى {"Error": السبب} عشان الصف يتسجل فيه الخطأ الحقيقي.
+    """
+    results, pending = {}, []
+    references, keys = {}, {}
+    for c in clients:
+        references[c["id"]] = reference, tier = _reference_benchmarks(c["field"])
+        keys[c["id"]] = _analysis_cache_key(c["field"], c["CPA"], c["CR"], c["ROAS"], c["orders"], c["visits"], reference)
+        cached = ai_cache.get(keys[c["id"]])
+        if cached is not None:
+            results[c["id"]] = _with_known_benchmarks(cached, reference, tier)
+        else:
+            pending.append(c)
+    if not pending:
+        return results
+
+    today = datetime.today().strftime("%Y-%m-%d")
+    clients_txt = "\n".join(
+        f'- id={c["id"]} | المجال: {display_field(c["field"])} | تكلفة جذب العميل (CPA) = {c["CPA"]:.2f} ريال'
+        f' | معدل التحويل (CR) = {c["CR"]*100:.2f}% | عائد الإنفاق الإعلاني (ROAS) = {c["ROAS"]:.2f}x'
+        f' | الأوردرات = {c["orders"]} | الزيارات = {c["visits"]}{_reference_benchmarks_item(references[c["id"]][0])}'
+        for c in pending
+    )
+    prompt = f"""
+    انت خبير تسويق في السعودية.
+    ✅ مسموح فقط باللغة العربية.
+    ❌ ممنوع استخدام أي كلمة أو جملة باللغة الإنجليزية.
+    ✅ إذا ذكرت الاختصارات CPA أو CR أو ROAS، يجب أن تكتب بهذا الشكل:
+    - تكلفة جذب العميل (CPA)
+    - معدل التحويل (CR)
+    - عائد الإنفاق الإعلاني (ROAS)
+    ✅ اجعل الرد منظم في شكل قائمة مرقمة (1، 2، 3 ...)، بجُمل قصيرة ومباشرة.
+
+    التاريخ: {today}
+
+    بيانات العملاء (كل سطر عميل مستقل وله id):
+    {clients_txt}
+
+    لكل عميل اعطني تحليل كامل يتضمن:
+    1. مؤشرات السوق السعودي الحالية (CPA, CR, ROAS) لمجاله (لو سطر العميل فيه مؤشرات مرجعية استخدمها كما هي).
+    2. مقارنة بين بيانات العميل والسوق (أفضل ✅ – أضعف ⚠ – غير منطقي ❌) ويُعرض بشكل مرقم (1، 2، 3).
+    3. تحذيرات إذا كانت البيانات غير منطقية (مثلاً CR > 20% أو ROAS > 10x أو زيارات < 100) وتكون أيضًا مرقمة.
+    4. توصيات عملية قصيرة ومباشرة وتكون في شكل قائمة مرقمة.
+
+    النتيجة لازم تكون JSON فقط: مصفوفة فيها عنصر لكل عميل بنفس الـ id بالصيغة:
+    [
+    {{
+    "id": "...",
+    "MarketBenchmarks": {{"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}},
+    "Analysis": ["1. ...", "2. ...", "3. ..."],
+    "Recommendations": ["1. ...", "2. ...", "3. ..."]
+    }}
+    ]
+    """
+    raw = _generate(prompt, schema=ANALYSIS_BATCH_SCHEMA)
+    with span("json.parse"):
+        items = _safe_parse_json(raw)
+
+    by_id = {}
+    if isinstance(items, list):
+        for item in items:
+            # كل عنصر بيتفحص لوحده: عنصر بايظ بيتعاد لوحده بس
+            if not validate(item, ANALYSIS_BATCH_SCHEMA["items"]):
+                by_id[str(item["id"])] = item
+
+    for c in pending:
+        item = by_id.get(str(c["id"]))
+        data = _normalize_analysis(dict(item)) if item else None
+        if data and (data["Analysis"] or data["Recommendations"]):
+            data.pop("id", None)
+            ai_cache.set(keys[c["id"]], data)
+            results[c["id"]] = _with_known_benchmarks(data, *references[c["id"]])
+        else:
+            # رد ناقص/بايظ للعميل ده بس ← طلب منفرد
+            try:
+                results[c["id"]] = get_ai_analysis(c["field"], c["CPA"], c["CR"], c["ROAS"], c["orders"], c["visits"])
+            except Exception as e:
+                results[c["id"]] = {"Error": f"{type(e).__name__}: {e}"}
+    return results
+
+def build_market_prompt(category_market, btype, country, selected_text):
+    """برومبت تقرير السوق (تبويب 5)"""
+    prompt_market = f"""
+    انت باحث تسويق متخصص في السعودية. 
+    ✅ مسموح فقط باللغة العربية المبسطة.
+    ❌ ممنوع استخدام أي كلمة أو جملة باللغة الإنجليزية.
+    ✅ لو لازم تذكر مصطلحات عالمية، اكتبها بالعربية متبوعة بالاختصار بين أقواس، مثل:
+    - معدل النمو السنوي المركب (CAGR)
+    ✅ اجعل كل جزء من التقرير في شكل قائمة مرقمة (1. ... 2. ... 3. ...).
+    ✅ كل نقطة لازم تكون جملة قصيرة ومباشرة (سطر واحد فقط).
+
+    اعطني تقرير عن السوق السعودي في مجال "{category_market}" للفئة "{btype}" 
+    في دولة {country} ومدن {selected_text}.
+
+    يجب أن يتضمن التقرير:
+    1. حجم السوق (بالريال السعودي أو عدد العملاء).
+    2. معدل النمو السنوي المركب (CAGR).
+    3. أقوى 3 منافسين حقيقيين.
+    4. تحليل SWOT (نقاط القوة، الضعف، الفرص، التهديدات) – كل قسم مرقم.
+    5. 3 توصيات عملية واضحة ومباشرة.
+
+    النتيجة لازم تكون JSON فقط بالصيغة:
+    {{
+    "MarketSize": "...",
+    "GrowthRate": 0.0,
+    "TopCompetitors": [". ...", ". ...", ". ..."],
+    "SWOT": {{"Strengths": [" ...", " ..."], "Weaknesses": [" ...", " ..."], "Opportunities": ["...", "..."], "Threats": [" ...", " ..."]}},
+    "Recommendations": ["...", "...", "..."]
+    }}
+    """
+    return prompt_market
+
+def get_market_report(category_market, btype, country, selected_text, on_item=None):
+    """تقرير السوق من AI (حجم السوق، النمو، المنافسين، SWOT، التوصيات)؛ on_item للعرض التدريجي"""
+    with span("prompt.build"):
+        prompt_market = build_market_prompt(category_market, btype, country, selected_text)
+    return _parse_validated(_generate(prompt_market, on_item, schema=MARKET_REPORT_SCHEMA), MARKET_REPORT_SCHEMA)
@@ -0,0 +1,127 @@
+import json
+
+
+class JsonStreamParser:
+    """
+    parser تدريجي لرد AI بصيغة JSON.
+    بياخد النص على دفعات (chunks) ويطلع كل قيمة بسيطة (نص/رقم) أول ما تكمل
+    مع مسارها، مثلًا ("Analysis", 0) أو ("SWOT", "Strengths", 2).
+    أي نص قبل أول { أو [ (زي ```json) بيتجاهل.
+    """
+
+    def __init__(self):
+        self._stack = []          # كل عنصر: {"t": "o"|"a", "key": ..., "i": ..., "expect_key": ...}
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._is_key = False
+        self._buf = []
+        self._scalar = []
+        self.done = False
+
+    def _path(self):
+        return tuple(c["key"] if c["t"] == "o" else c["i"] for c in self._stack)
+
+    def _flush_scalar(self, events):
+        if not self._scalar:
+            return
+        token = "".join(self._scalar)
+        self._scalar = []
+        try:
+            value = json.loads(token)
+        except ValueError:
+            value = token
+        events.append((self._path(), value))
+
+    def _feed_char(self, ch, events):
+        if self.done:
+            return
+        if not self._started:
+            if ch not in "{[":
+                return
+            self._started = True
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+                self._buf.append(ch)
+            elif ch == "\\":
+                self._escape = True
+                self._buf.append(ch)
+            elif ch == '"':
+                self._in_string = False
+                raw = "".join(self._buf)
+                try:
+                    value = json.loads(f'"{raw}"')
+                except ValueError:
+                    value = raw
+                top = self._stack[-1] if self._stack else None
+                if self._is_key and top is not None:
+                    top["key"] = value
+                    top["expect_key"] = False
+                else:
+                    events.append((self._path(), value))
+            else:
+                self._buf.append(ch)
+            return
+
+        if ch.isspace():
+            self._flush_scalar(events)
+        elif ch == '"':
+            self._flush_scalar(events)
+            top = self._stack[-1] if self._stack else None
+            self._in_string = True
+            self._buf = []
+            self._is_key = top is not None and top["t"] == "o" and top["expect_key"]
+        elif ch == "{":
+            self._stack.append({"t": "o", "key": None, "expect_key": True})
+        elif ch == "[":
+            self._stack.append({"t": "a", "i": 0})
+        elif ch in "}]":
+            self._flush_scalar(events)
+            if self._stack:
+                self._stack.pop()
+            if not self._stack:
+                self.done = True
+        elif ch == ",":
+            self._flush_scalar(events)
+            top = self._stack[-1] if self._stack else None
+            if top is not None and top["t"] == "o":
+                top["key"] = None
+                top["expect_key"] = True
+            elif top is not None:
+                top["i"] += 1
+        elif ch == ":":
+            pass
+        else:
+            self._scalar.append(ch)
+
+    def feed(self, text):
+        """إضافة دفعة نص جديدة؛ بترجع قائمة (path, value) للقيم اللي كملت فيها"""
+        events = []
+        for ch in text:
+            self._feed_char(ch, events)
+        return events
+
+
+def iter_leaves(data, path=()):
+    """نفس أحداث الـ parser لكن من dict/list جاهز (لإعادة عرض نتيجة من الكاش)"""
+    if isinstance(data, dict):
+        for k, v in data.items():
+            yield from iter_leaves(v, path + (k,))
+    elif isinstance(data, list):
+        for i, v in enumerate(data):
+            yield from iter_leaves(v, path + (i,))
+    else:
+        yield path, data
+
+
+def stream_generate(chunks, on_item):
+    """قراءة الرد stream (دفعات نصية) ونداء on_item(path, value) لكل قيمة أول ما تكمل؛ بترجع النص كامل"""
+    parser = JsonStreamParser()
+    parts = []
+    for text in chunks:
+        parts.append(text)
+        for path, value in parser.feed(text):
+            on_item(path, value)
+    return "".join(parts)
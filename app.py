@@ -1,30 +1,61 @@
 import streamlit as st
 import pandas as pd
-import google.generativeai as genai
-import json
 from datetime import datetime
-from docx import Document
-import os
-import base64
-from dotenv import load_dotenv
+from io import BytesIO
+import time
+from ai_service import AIResponseError, _to_float, clean_text_ar, get_ai_analysis, get_market_report
+from assets import load_css, static_image_url
+from bulk import BULK_MAX_WORKERS, BULK_REFRESH_SECONDS, RESULT_COLUMNS, run_resumable
+from data_store import get_reference_indexes, load_table
+from ingest import INGEST_PREVIEW_ROWS, UPLOAD_TYPES, ResultSink, estimate_rows, iter_chunks, read_upload
+from jobs import bulk_runner, is_interrupted, job_id_for, job_output, list_jobs, read_status, resume_job, submit_job
+from journal import BulkJournal, content_hash
+from kpi import compute_kpi, compute_kpis
+from offline_batch import export_batch_requests, ingest_batch_responses
+from resilience import CircuitOpenError
+from reports import build_report_cached, export_market_report_to_docx, export_to_docx
+from tracing import end_trace, stage_breakdown, start_profile, start_trace, stop_active_profile, stop_profile, traced
+_ST_VERSION = tuple(int(x) for x in st.__version__.split(".")[:2])
+# st.download_button بيقبل callable في data من 1.50، وساعتها الملف بيتبني بس لما المستخدم يدوس تنزيل
+_DEFERRED_DOWNLOADS = _ST_VERSION >= (1, 50)
+# on_click="ignore" (من 1.43) بيخلي زر التنزيل ما يعملش rerun، فينفع أثناء تحليل BULK شغال
+_PARTIAL_DOWNLOADS = _ST_VERSION >= (1, 43)
+
+def polling(fn, seconds=2):
+    """st.fragment(run_every) (من 1.37) بيحدث الجزء ده لوحده كل كام ثانية من غير rerun للصفحة كلها"""
+    fragment = getattr(st, "fragment", None)
+    return fragment(run_every=seconds)(fn) if fragment else fn
+
+def report_download_data(builder, data):
+    """بيانات زر التنزيل: بناء كسول لو Streamlit بيدعمه، والنتيجة متكاشة بـ hash المحتوى"""
+    if _DEFERRED_DOWNLOADS:
+        return lambda: build_report_cached(builder, data)
+    return build_report_cached(builder, data)
+
+@traced("assets.css")
 def local_css(file_name):
-    with open(file_name, encoding='utf-8') as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{load_css(file_name)}</style>", unsafe_allow_html=True)
+
+# ===================== تتبع زمن المراحل =====================
+# كل rerun هو trace؛ المراحل (تحميل Excel، الخلفية، البرومبت، الموديل، JSON، الرسم، Word) بتتسجل تحته
+rerun_trace = start_trace("rerun")
+# الـ rerun اللي قبله ممكن يكون اتقطع (RerunException/StopException) قبل stop_profile في آخر الملف
+stop_active_profile()
+rerun_profiler = start_profile() if st.session_state.get("profile_rerun") else None
 
 # نادِ الفانكشن في بداية البرنامج بعد set_page_config
 local_css("main.css")
 
 # ================= دالة إضافة الخلفية =================
+@traced("assets.background")
 def add_bg_from_local(image_file):
-    with open(image_file, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
-    ext = image_file.split('.')[-1]
-    mime_type = f"image/{'svg+xml' if ext == 'svg' else ext}"
+    # الصورة بتتجهز مرة واحدة وبتتخدم كملف static بدل base64 في كل rerun
+    bg_url = static_image_url(image_file)
     st.markdown(f"""
         <style>
         /* ===== الخلفية الأساسية ===== */
         .stApp {{
-            background-image: url("data:{mime_type};base64,{encoded}");
+            background-image: url("{bg_url}");
             background-size: cover;
             background-position: center;
             background-repeat: no-repeat;
@@ -52,291 +83,12 @@ def add_bg_from_local(image_file):
 
 # ================= نادِ الخلفية =================
 add_bg_from_local("rana.png")
-# ===================== إعداد مفتاح Google Generative AI =====================
-# Load environment variables from .env file
-load_dotenv()
-# Get the API key from environment
-api_key = os.getenv("GEMINI_API_KEY")
-# Configure the Gemini client
-genai.configure(api_key=api_key)
-
-# ===================== دوال مساعدة عامة =====================
-def _safe_parse_json(raw_text: str):
-    """تنظيف وتحويل رد AI إلى JSON صالح"""
-    if not isinstance(raw_text, str):
-        return None
-    txt = raw_text.strip()
-    if txt.startswith("```"):
-        txt = txt.strip("`")
-        if txt.lower().startswith("json"):
-            txt = txt[4:].strip()
-    try:
-        return json.loads(txt)
-    except Exception:
-        return None
-
-def _to_float(x, default=0.0):
-    try:
-        if isinstance(x, str):
-            x = x.replace("%", "").strip()
-        return float(x)
-    except Exception:
-        return default
-
-# ===================== Benchmarks كلاسيكية + تحليل نصي لتبويبات 3 و 4 =====================
-def get_benchmarks_from_ai(category: str):
-    """
-    تجلب Benchmarks تقديرية للسوق السعودي (CPA, CR, ROAS) وتحوّلها لأرقام آمنة.
-    """
-    prompt = f"""
-    اكتب فقط JSON صالح (بدون أي نص إضافي) لمتوسط مؤشرات السوق السعودي لمجال "{category}".
-    استخدم هذه البنية:
-    {{
-      "CPA": 0.0,
-      "CR": 0.0,
-      "ROAS": 0.0
-    }}
-    جميع القيم أرقام (بدون وحدات/رموز).
-    واكتب بالعربية لو فيه أسماء حقول إضافية.
-    """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    resp = model.generate_content(prompt)
-    data = _safe_parse_json(resp.text or "") or {}
-    # تحويل آمن
-    return {
-        "CPA": _to_float(data.get("CPA", 0)),
-        "CR": _to_float(data.get("CR", 0)),
-        "ROAS": _to_float(data.get("ROAS", 0)),
-    }
-
-def analyze(client, market):
-    """
-    مقارنة سريعة بين أداء العميل والسوق.
-    تتوقع مفاتيح client: CPA(optional), CR, ROAS, NetProfit/ProfitMargin(optional)
-    """
-    analysis = []
-    # CPA (اختياري)
-    if "CPA" in client and client["CPA"] is not None:
-        if client["CPA"] > market["CPA"]:
-            analysis.append(f"🔴 CPA عندك = {client['CPA']:.2f} ريال أعلى من السوق ({market['CPA']:.2f} ريال).")
-        else:
-            analysis.append(f"🟢 CPA عندك = {client['CPA']:.2f} ريال أفضل من السوق ({market['CPA']:.2f} ريال).")
-
-    # CR
-    analysis.append(f"CR = {client['CR']*100:.2f}% مقابل السوق {market['CR']*100:.2f}%.")
-
-    # ROAS
-    if client["ROAS"] >= market["ROAS"]:
-        analysis.append(f"🟢 ROAS = {client['ROAS']:.2f}x أفضل من السوق ({market['ROAS']:.2f}x).")
-    else:
-        analysis.append(f"🔴 ROAS = {client['ROAS']:.2f}x أقل من السوق ({market['ROAS']:.2f}x).")
-
-    # ربحية (اختياري)
-    if "NetProfit" in client:
-        analysis.append(f"صافي الربح/طلب (ريال) = {client['NetProfit']:.2f}")
-    elif "ProfitMargin" in client:
-        analysis.append(f"هامش الربح/طلب (ريال) = {client['ProfitMargin']:.2f}")
-
-    return "\n".join(analysis)
-
-# ===================== دوال تحليـل الدروب شوبينج (كودك) =====================
-def get_ai_analysis(field, CPA, CR, ROAS, orders, visits):
-    """جلب Benchmarks السوق + التحليل مباشرة من AI (بالعربية فقط)"""
-    today = datetime.today().strftime("%Y-%m-%d")
-
-    # prompt = f"""
-    # انت خبير تسويق في السعودية.
-    # اكتب الرد بالعربية فقط.
-    # التاريخ: {today}
-    # المجال: {field}
-
-    # بيانات العميل:
-    # - CPA = {CPA:.2f} ريال
-    # - CR = {CR*100:.2f}%
-    # - ROAS = {ROAS:.2f}x
-    # - الأوردرات = {orders}
-    # - الزيارات = {visits}
-
-    # اعطني تحليل كامل يتضمن:
-    # 1. مؤشرات السوق السعودي اليوم (CPA, CR, ROAS) لمجال {field}.
-    # 2. مقارنة بين بيانات العميل والسوق (هل العميل أفضل ✅ أم أضعف ⚠ أم غير منطقي ❌).
-    # 3. تحذير إذا كانت بيانات العميل غير منطقية (مثلا CR > 20% أو ROAS > 10x أو زيارات < 100).
-    # 4. توصيات عملية لتحسين الأداء.
-
-    # ارجع النتيجة كـ JSON فقط بالصيغة:
-    # {{
-    #   "MarketBenchmarks": {{"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}},
-    #   "Analysis": ["نقطة مقارنة 1", "نقطة مقارنة 2", "نقطة مقارنة 3"],
-    #   "Recommendations": ["التوصية 1", "التوصية 2", "التوصية 3"]
-    # }}
-    # لا تضف أي نص خارج JSON.
-    # """
-def clean_text_ar(text: str) -> str:
-    """تنظيف النص: حذف أي إنجليزي وتصحيح المسافات"""
-    import re
-    # شيل أي حروف إنجليزية
-    text = re.sub(r'[A-Za-z]', '', text)
-    # تصحيح المسافات المكررة
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
-def get_ai_analysis(field, CPA, CR, ROAS, orders, visits):
-    """جلب Benchmarks السوق + التحليل مباشرة من AI (بالعربية فقط ومنظم)"""
-    today = datetime.today().strftime("%Y-%m-%d")
-
-    prompt = f"""
-    انت خبير تسويق في السعودية.
-    ✅ مسموح فقط باللغة العربية.
-    ❌ ممنوع استخدام أي كلمة أو جملة باللغة الإنجليزية.
-    ✅ إذا ذكرت الاختصارات CPA أو CR أو ROAS، يجب أن تكتب بهذا الشكل:
-    - تكلفة جذب العميل (CPA)
-    - معدل التحويل (CR)
-    - عائد الإنفاق الإعلاني (ROAS)
-    ✅ اجعل الرد منظم في شكل قائمة مرقمة (1، 2، 3 ...)، بجُمل قصيرة ومباشرة.
-
-    التاريخ: {today}
-    المجال: {field}
-
-    بيانات العميل:
-    - تكلفة جذب العميل (CPA) = {CPA:.2f} ريال
-    - معدل التحويل (CR) = {CR*100:.2f}%
-    - عائد الإنفاق الإعلاني (ROAS) = {ROAS:.2f}x
-    - الأوردرات = {orders}
-    - الزيارات = {visits}
-
-    اعطني تحليل كامل يتضمن:
-    1. مؤشرات السوق السعودي الحالية (CPA, CR, ROAS).
-    2. مقارنة بين بيانات العميل والسوق (أفضل ✅ – أضعف ⚠ – غير منطقي ❌) ويُعرض بشكل مرقم (1، 2، 3).
-    3. تحذيرات إذا كانت البيانات غير منطقية (مثلاً CR > 20% أو ROAS > 10x أو زيارات < 100) وتكون أيضًا مرقمة.
-    4. توصيات عملية قصيرة ومباشرة وتكون في شكل قائمة مرقمة.
-
-    النتيجة لازم تكون JSON فقط بالصيغة:
-    {{
-    "MarketBenchmarks": {{"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}},
-    "Analysis": ["1. ...", "2. ...", "3. ..."],
-    "Recommendations": ["1. ...", "2. ...", "3. ..."]
-    }}
-    """
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    response = model.generate_content(prompt)
-    data = _safe_parse_json(response.text or "") or {}
-
-    # تطبيع Benchmarks
-    if "MarketBenchmarks" in data and isinstance(data["MarketBenchmarks"], dict):
-        mb = data["MarketBenchmarks"]
-        data["MarketBenchmarks"] = {
-            "CPA": _to_float(mb.get("CPA", 0)),
-            "CR": _to_float(mb.get("CR", 0)),
-            "ROAS": _to_float(mb.get("ROAS", 0)),
-        }
-    else:
-        data["MarketBenchmarks"] = {"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}
-
-    # تنظيف النصوص من أي إنجليزي أو لخبطة
-    data["Analysis"] = [clean_text_ar(a) for a in data.get("Analysis", [])]
-    data["Recommendations"] = [clean_text_ar(r) for r in data.get("Recommendations", [])]
-
-    return data
-
-
-    model = genai.GenerativeModel("models/gemini-2.5-flash")
-    response = model.generate_content(prompt)
-    data = _safe_parse_json(response.text or "") or {}
-    # تطبيع الأرقام
-    if "MarketBenchmarks" in data and isinstance(data["MarketBenchmarks"], dict):
-        mb = data["MarketBenchmarks"]
-        data["MarketBenchmarks"] = {
-            "CPA": _to_float(mb.get("CPA", 0)),
-            "CR": _to_float(mb.get("CR", 0)),
-            "ROAS": _to_float(mb.get("ROAS", 0)),
-        }
-    else:
-        data["MarketBenchmarks"] = {"CPA": 0.0, "CR": 0.0, "ROAS": 0.0}
-    # تأكد من القوائم
-    data.setdefault("Analysis", [])
-    data.setdefault("Recommendations", [])
-    return data
-
-def export_to_docx(analysis_data, filename="AI_Report.docx"):
-    """تحويل تحليل الدروب شوبينج والتوصيات إلى Word"""
-    doc = Document()
-    doc.add_heading("📑 تقرير السوق (تحليل AI)", 0)
-
-    # Benchmarks السوق
-    doc.add_heading("📊 Benchmarks السوق", level=1)
-    bm = analysis_data.get("MarketBenchmarks", {})
-    doc.add_paragraph(f"CPA (تكلفة الاكتساب) = {bm.get('CPA', 0):.2f} ريال")
-    doc.add_paragraph(f"CR (معدل التحويل) = {bm.get('CR', 0)*100:.2f}%")
-    doc.add_paragraph(f"ROAS (العائد على الإعلان) = {bm.get('ROAS', 0):.2f}x")
-
-    # التحليل
-    doc.add_heading("📊 التحليل", level=1)
-    for line in analysis_data.get("Analysis", []):
-        doc.add_paragraph(f"• {line}")
-
-    # التوصيات
-    doc.add_heading("📌 التوصيات العملية", level=1)
-    for rec in analysis_data.get("Recommendations", []):
-        doc.add_paragraph(f"- {rec}")
-
-    doc.save(filename)
-    return filename
-
-# ====== دالة لتصدير تقرير السوق العام كـ Word (تبويب 5) ======
-def export_market_report_to_docx(data, filename="Market_Report.docx"):
-    doc = Document()
-
-    # العنوان الرئيسي
-    doc.add_heading("📑 تقرير السوق", 0)
-
-    # حجم السوق
-    doc.add_heading("📊 حجم السوق (تقديري)", level=1)
-    doc.add_paragraph(str(data.get("MarketSize", "-")))
-
-    # معدل النمو السنوي
-    doc.add_heading("📈 معدل النمو السنوي (CAGR)", level=1)
-    gr = data.get("GrowthRate", "-")
-    gr_txt = f"{gr:.2f}%" if isinstance(gr, (int, float)) else str(gr)
-    doc.add_paragraph(gr_txt)
-
-    # المنافسين
-    doc.add_heading("🏆 أقوى المنافسين في السعودية", level=1)
-    comp = data.get("TopCompetitors", []) or []
-    for i, c in enumerate(comp, 1):
-        doc.add_paragraph(f"{i}. {c}")
-
-    # تحليل SWOT
-    doc.add_heading("🔍 تحليل SWOT", level=1)
-    sw = data.get("SWOT", {}) or {}
-
-    doc.add_heading("✅ نقاط القوة", level=2)
-    for s in sw.get("Strengths", []) or []:
-        doc.add_paragraph(f"• {s}")
-
-    doc.add_heading("⚠ نقاط الضعف", level=2)
-    for w in sw.get("Weaknesses", []) or []:
-        doc.add_paragraph(f"• {w}")
-
-    doc.add_heading("💡 الفرص", level=2)
-    for o in sw.get("Opportunities", []) or []:
-        doc.add_paragraph(f"• {o}")
-
-    doc.add_heading("🚨 التهديدات", level=2)
-    for t in sw.get("Threats", []) or []:
-        doc.add_paragraph(f"• {t}")
-
-    # التوصيات
-    doc.add_heading("📌 التوصيات", level=1)
-    for r in data.get("Recommendations", []) or []:
-        doc.add_paragraph(f"• {r}")
-
-    doc.save(filename)
-    return filename
-
 # ===================== تحميل البيانات =====================
-clients = pd.read_excel("ClientsData_with_SubCategory.xlsx")
-df = pd.read_excel("locations_data.xlsx")
-countries = df['الدولة'].unique()
+# كاش على مستوى البروسيس: الـ rerun العادي ما بيقراش أي ملف
+clients = load_table("ClientsData_with_SubCategory.xlsx")
+df = load_table("locations_data.xlsx")
+ref_idx = get_reference_indexes(clients, df)
+countries = ref_idx["countries"]
 
 # ===================== واجهة Streamlit =====================
 st.set_page_config(page_title="تحليل مؤشرات المتاجر", page_icon="", layout="wide")
@@ -403,49 +155,206 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs([
 with tab1:
     # ===== رفع الملف =====
     # st.subheader("⬆ رفع ملف العملاء (Excel)")
-    uploaded_file = st.file_uploader("⬆ رفع ملف العملاء (Excel)", type=["xlsx"])
-
-    if uploaded_file:
-        df_clients = pd.read_excel(uploaded_file)
-
-        # ===== حساب مؤشرات العميل =====
-        df_clients["CPA"] = df_clients.apply(lambda x: x["الميزانية الإعلانية"]/x["عدد الأوردرات"] if x["عدد الأوردرات"]>0 else 0, axis=1)
-        df_clients["CR"] = df_clients.apply(lambda x: x["عدد الأوردرات"]/x["عدد الزيارات"] if x["عدد الزيارات"]>0 else 0, axis=1)
-        df_clients["ROAS"] = df_clients.apply(lambda x: (x["عدد الأوردرات"]*x["سعر المنتج"])/x["الميزانية الإعلانية"] if x["الميزانية الإعلانية"]>0 else 0, axis=1)
-
-        # ===== تحليل AI لكل صف =====
-        st.info("⚡ جاري تحليل السوق لكل عميل، يرجى الانتظار...")
-        market_CPAs, market_CRs, market_ROASs, analyses, recs = [], [], [], [], []
-
-        for idx, row in df_clients.iterrows():
-            field = row["المجال"]
-            ai_result = get_ai_analysis(field, row["CPA"], row["CR"], row["ROAS"], row["عدد الأوردرات"], row["عدد الزيارات"])
-            market_CPAs.append(ai_result["MarketBenchmarks"]["CPA"])
-            market_CRs.append(ai_result["MarketBenchmarks"]["CR"])
-            market_ROASs.append(ai_result["MarketBenchmarks"]["ROAS"])
-            analyses.append(" | ".join(ai_result.get("Analysis",[])))
-            recs.append(" | ".join(ai_result.get("Recommendations",[])))
-
-        df_clients["Market_CPA"] = market_CPAs
-        df_clients["Market_CR"] = market_CRs
-        df_clients["Market_ROAS"] = market_ROASs
-        df_clients["Analysis"] = analyses
-        df_clients["Recommendations"] = recs
+    uploaded_file = st.file_uploader("⬆ رفع ملف العملاء (Excel / CSV / Parquet)", type=UPLOAD_TYPES)
+    max_workers = st.slider("عدد الطلبات المتوازية للـ AI", min_value=1, max_value=32, value=BULK_MAX_WORKERS)
+    bulk_modes = {
+        "rows": "تحليل AI كامل لكل عميل",
+        "batched": "تحليل AI مجمّع (عدة عملاء في كل طلب)",
+        "categories": "Benchmarks لكل مجال + مقارنة محلية",
+        "offline": "دفعات Batch بملفات JSONL (أرخص للملفات الكبيرة)",
+    }
+    bulk_mode = st.radio(
+        "طريقة التحليل",
+        options=list(bulk_modes),
+        format_func=bulk_modes.get,
+        horizontal=True,
+        key="bulk_mode",
+    )
+    run_in_background = st.toggle("تشغيل في الخلفية (التحليل يكمل حتى لو قفلت الصفحة)", key="bulk_background")
+
+    if uploaded_file and bulk_mode == "offline":
+        # التحليل بيتم برا الواجهة: تنزيل ملف الطلبات، تشغيله على Batch API (أو بديل محلي)، ورفع ملف الردود
+        df_clients = read_upload(uploaded_file, uploaded_file.name)
+        compute_kpis(df_clients)
+        if df_clients.empty:
+            st.warning("⚠ الملف فيه العناوين بس، مفيش عملاء للتحليل.")
+        stem = uploaded_file.name.rsplit(".", 1)[0]
+        st.download_button(
+            "⬇ تنزيل ملف الطلبات (requests.jsonl)",
+            data=export_batch_requests(df_clients),
+            file_name=f"{stem}_requests.jsonl",
+            mime="application/jsonl",
+        )
+        responses_file = st.file_uploader("⬆ رفع ملف الردود (responses.jsonl)", type=["jsonl", "json"], key="bulk_batch_responses")
+        if responses_file:
+            results = ingest_batch_responses(df_clients, responses_file.getvalue())
+            for col in results.columns:
+                df_clients[col] = results[col]
+
+            failed = int((df_clients["Error"] != "").sum())
+            if failed:
+                st.warning(f"⚠ تعذر دمج {failed} صف، التفاصيل في عمود Error.")
+            st.success(f"✅ تم دمج الردود لـ {len(df_clients) - failed} عميل!")
+
+            excel_buf = BytesIO()
+            df_clients.to_excel(excel_buf, index=False)
+            st.download_button(
+                "⬇ تنزيل ملف التحليل الكامل",
+                data=excel_buf.getvalue(),
+                file_name=f"BULK_Analysis_{datetime.today().strftime('%Y-%m-%d')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+            st.dataframe(df_clients)
+    elif uploaded_file and run_in_background:
+        # المهمة بتتسجل مرة واحدة لكل ملف وطريقة؛ الـ reruns بعد كده بتتابع حالتها بس
+        upload_hash = content_hash(uploaded_file.getvalue())
+        job_id = job_id_for(upload_hash, bulk_mode)
+        # الجلسة بتتابع المهام اللي هي بعتتها بس
+        session_jobs = st.session_state.setdefault("bulk_job_ids", [])
+        if job_id not in session_jobs:
+            session_jobs.append(job_id)
+        if read_status(job_id) is None:
+            df_clients = read_upload(uploaded_file, uploaded_file.name)
+            if df_clients.empty:
+                st.warning("⚠ الملف فيه العناوين بس، مفيش عملاء للتحليل.")
+            else:
+                compute_kpis(df_clients)
+                submit_job(df_clients, upload_hash, bulk_mode, file_name=uploaded_file.name, max_workers=max_workers)
+                st.info("🚀 تم إرسال الملف للتحليل في الخلفية، تقدر تتنقل بين التبويبات أو تقفل الصفحة وترجع بعدين.")
+    elif uploaded_file:
+        # الملف بيتقري chunk ورا chunk: كل chunk بيتحسبله الـ KPIs ويتحلل ويتكتب على الديسك قبل اللي بعده،
+        # فالذاكرة ثابتة مهما كان عدد الصفوف
+        upload_hash = content_hash(uploaded_file.getvalue())
+        total = estimate_rows(uploaded_file, uploaded_file.name)
+
+        # ===== تحليل AI لكل صف (شريط تقدم + جدول بيتملى أول بأول) =====
+        preview_box = st.empty()
+        progress_bar = st.progress(0.0, text="⚡ جاري قراءة الملف وتحليل السوق لكل عميل، يرجى الانتظار...")
+        partial_download_box = st.empty()
+        table_box = st.empty()
+
+        # سجل التشغيل: نفس الملف بنفس الطريقة بيكمل من آخر صف خلص
+        journal = BulkJournal(upload_hash, bulk_mode)
+        resumed = journal.load()
+        if resumed:
+            st.info(f"♻ تم استرجاع {len(resumed)} صف من تشغيل سابق لنفس الملف، وهيتم استكمال الباقي فقط.")
+        progress = {"done": 0, "replayed": 0, "refreshed": 0.0, "started": time.time()}
+        sink = ResultSink()
+        current = {}   # الـ chunk اللي بيتحلل دلوقتي (الجدول الجزئي بيعرضه هو بس)
+
+        def partial_csv():
+            # الـ chunks اللي خلصت + الصفوف اللي خلصت في الـ chunk الحالي
+            partial = current["partial"]
+            return sink.csv_bytes(pending=partial[partial["Error"].notna()])
+
+        def on_row(position, result):
+            partial = current["partial"]
+            partial.iloc[position - current["offset"], current["positions"]] = [result[col] for col in RESULT_COLUMNS]
+            progress["done"] += 1
+            # الصفوف المسترجعة من السجل بتتعد وقت ما توصل فعلاً (ممكن تكون في chunks بعدين)
+            progress["replayed"] += position in resumed
+            done = progress["done"]
+            now = time.time()
+            # الوقت المتبقي حسب متوسط الوقت الفعلي لكل صف اتحلل في التشغيل ده
+            fresh = done - progress["replayed"]
+            if total:
+                eta = (now - progress["started"]) / fresh * max(total - done, 0) if fresh > 0 else 0
+                progress_bar.progress(min(done / total, 1.0), text=f"⏳ تم تحليل {done} من {total} — الوقت المتبقي تقريبًا {eta:.0f} ثانية")
+            else:
+                progress_bar.progress(0.0, text=f"⏳ تم تحليل {done} صف")
+            if now - progress["refreshed"] < BULK_REFRESH_SECONDS:
+                return
+            progress["refreshed"] = now
+            table_box.dataframe(partial)
+            if _PARTIAL_DOWNLOADS:
+                partial_download_box.download_button(
+                    f"⬇ تنزيل النتائج الحالية (CSV — {done} صف)",
+                    # الـ CSV بيكبر مع التشغيل: بيتقري بس لما المستخدم يدوس تنزيل لو Streamlit بيدعم ده
+                    data=partial_csv if _DEFERRED_DOWNLOADS else partial_csv(),
+                    file_name=f"BULK_Analysis_partial_{datetime.today().strftime('%Y-%m-%d')}.csv",
+                    mime="text/csv",
+                    key=f"bulk_partial_{done}",
+                    on_click="ignore",
+                )
 
+        runner, runner_kwargs = bulk_runner(bulk_mode)
+        first_rows = None
+        try:
+            for df_chunk in iter_chunks(uploaded_file, uploaded_file.name):
+                offset = int(df_chunk.index[0])
+                if first_rows is None:
+                    # معاينة سريعة لأول الصفوف وباقي الملف لسه بيتقري
+                    preview_box.dataframe(df_chunk.head(INGEST_PREVIEW_ROWS))
+
+                # ===== حساب مؤشرات العميل =====
+                compute_kpis(df_chunk)
+
+                partial = df_chunk.copy()
+                for col in RESULT_COLUMNS:
+                    partial[col] = None
+                current.update(partial=partial, offset=offset, positions=[partial.columns.get_loc(col) for col in RESULT_COLUMNS])
+                results = run_resumable(
+                    df_chunk, runner, journal, completed=resumed, on_row=on_row, offset=offset, max_workers=max_workers, **runner_kwargs
+                )
+                for col in results.columns:
+                    df_chunk[col] = results[col]
+                sink.write(df_chunk)
+                if first_rows is None:
+                    first_rows = df_chunk.head(INGEST_PREVIEW_ROWS)
+            export_data = sink.close()
+        finally:
+            # الملفات المؤقتة بتتمسح حتى لو التشغيل اتقطع (rerun/stop)؛ الصفوف اللي خلصت في السجل
+            sink.cleanup()
+        preview_box.empty()
+        partial_download_box.empty()
+        table_box.empty()
+        progress_bar.progress(1.0, text=f"✅ تم تحليل {sink.rows} صف")
+
+        if sink.failed:
+            st.warning(f"⚠ تعذر تحليل {sink.failed} صف، التفاصيل في عمود Error.")
         st.success("✅ تم اكتمال التحليل لكل العملاء!")
 
         # ===== تنزيل Excel =====
         export_file = f"BULK_Analysis_{datetime.today().strftime('%Y-%m-%d')}.xlsx"
-        df_clients.to_excel(export_file, index=False)
-        with open(export_file, "rb") as f:
-            st.download_button(
-                "⬇ تنزيل ملف التحليل الكامل",
-                data=f,
-                file_name=export_file,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        st.download_button(
+            "⬇ تنزيل ملف التحليل الكامل",
+            data=export_data,
+            file_name=export_file,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
+        if first_rows is not None:
+            st.caption(f"أول {len(first_rows)} صف من {sink.rows} (الملف الكامل في التنزيل)")
+            st.dataframe(first_rows)
+
+    # ===== متابعة مهام الخلفية =====
+    @polling
+    def render_bulk_jobs():
+        jobs = list_jobs(st.session_state.get("bulk_job_ids", []))
+        if not jobs:
+            return
+        st.markdown("### 🗂 مهام التحليل في الخلفية")
+        for job in jobs:
+            job_id = job["job_id"]
+            st.markdown(f"**{job['file_name']}** — {bulk_modes.get(job['mode'], job['mode'])}")
+            total = max(job["total"], 1)
+            if job["state"] == "done":
+                st.progress(1.0, text=f"✅ اكتمل ({job['total']} صف، {job['failed']} صف فيه خطأ)")
+                st.download_button(
+                    "⬇ تنزيل ملف التحليل الكامل",
+                    data=(lambda job_id=job_id: job_output(job_id)) if _DEFERRED_DOWNLOADS else job_output(job_id),
+                    file_name=f"BULK_Analysis_{job_id}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key=f"bulk_job_download_{job_id}",
+                )
+            elif job["state"] == "failed" or is_interrupted(job):
+                st.progress(job["done"] / total, text=f"⛔ توقف عند {job['done']} من {job['total']} {job.get('error', '')}")
+                if st.button("▶ استكمال التحليل", key=f"bulk_job_resume_{job_id}"):
+                    resume_job(job_id)
+            else:
+                st.progress(job["done"] / total, text=f"⏳ تم تحليل {job['done']} من {job['total']}")
 
-        st.dataframe(df_clients)
+    render_bulk_jobs()
 
 # ========== تبويب 2 (دروب شوبينج بكودك) ==========
 # with tab2:
@@ -540,8 +449,8 @@ with tab2:
     # st.markdown('<div class="form-container">', unsafe_allow_html=True)
     with st.form("form_ds"):
         st.markdown('<h3 class="main-title">➕ إدخال بيانات عميل دروب شوبينج</h3>', unsafe_allow_html=True)
-        categories = clients["Category"].dropna().unique().tolist()
-        subcategories = clients["SubCategory"].dropna().unique().tolist()
+        categories = ref_idx["categories"]
+        subcategories = ref_idx["subcategories"]
 
         col1, col2 = st.columns(2)
         with col1:
@@ -572,8 +481,8 @@ with tab3:
     with st.form("form_private"):
         st.subheader("➕ إدخال بيانات عميل منتجات خاصة")
         # ↓↓↓ جلب القوائم من ملف العملاء
-        categories = clients["Category"].dropna().unique().tolist() if "Category" in clients.columns else []
-        subcategories = clients["SubCategory"].dropna().unique().tolist() if "SubCategory" in clients.columns else []
+        categories = ref_idx["categories"]
+        subcategories = ref_idx["subcategories"]
 
         ccol1, ccol2 = st.columns(2)
         with ccol1:
@@ -613,9 +522,7 @@ with tab3:
             st.error("⚠ عدد الأوردرات لا يمكن أن يكون أكبر من عدد الزيارات.")
         else:
             # حساب مؤشرات العميل
-            CPA = ad_budget / orders if orders > 0 else 0
-            CR  = (orders / visits) if visits > 0 else 0
-            ROAS = (orders * price) / ad_budget if ad_budget > 0 else 0
+            CPA, CR, ROAS = compute_kpi(price, ad_budget, orders, visits)
 
             # عرض النتائج
             st.markdown("""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
@@ -635,93 +542,91 @@ with tab3:
                 field += f" - {subcategory}"
 
             try:
-                analysis_data = get_ai_analysis(field, CPA, CR, ROAS, orders, visits)
+                # أماكن ثابتة لكل قسم عشان كل نقطة تظهر أول ما توصل من AI (streaming)
+                # Benchmarks السوق
+                st.markdown(f"""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
+                <h3 style="color: white; text-align: center;">
+                🔹 Benchmarks السوق السعودي ({field})
+                </h3></div>""",     
+                unsafe_allow_html=True )
+                bm_box = st.empty()
+
+                # التحليل
+                st.markdown("""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
+                <h3 style="color: white; text-align: center;">📊 التحليل</h3>
+                </div>""",     
+                unsafe_allow_html=True )
+                analysis_box = st.container()
+
+                # التوصيات
+                st.markdown("""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
+                <h3 style="color: white; text-align: center;">📌 التوصيات العملية لتحسين الأداء</h3>
+                </div>""",     
+                unsafe_allow_html=True )
+                recs_box = st.container()
+
+                def render_benchmarks(bm):
+                    with bm_box.container():
+                        c1, c2, c3 = st.columns(3)
+                        c1.metric("CPA (متوسط السوق)", f"{bm.get('CPA', 0):.2f} ريال")
+                        c2.metric("CR (متوسط السوق)", f"{bm.get('CR', 0)*100:.2f}%")
+                        c3.metric("ROAS (متوسط السوق)", f"{bm.get('ROAS', 0):.2f}x")
+
+                def render_card(box, text):
+                    box.markdown(f"""
+                    <div style="
+                        position: relative;
+                        background: linear-gradient(135deg, rgba(255,255,255,0.1), rgba(255,255,255,0.05));
+                        backdrop-filter: blur(10px);
+                        border: 1px solid rgba(255,255,255,0.2);
+                        box-shadow: 0 2px 8px rgba(0,0,0,0.3);
+                        border-radius: 10px;
+                        padding: 10px 14px;
+                        margin: 8px 0;
+                    ">
+                        <p style="
+                            color: #f0f0f0;
+                            font-size: 0.95rem;
+                            font-family: 'Cairo', sans-serif;
+                            line-height: 1.6;
+                            text-align: right;
+                            direction: rtl;
+                        ">🔹 {text}</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                streamed_bm = {}
+
+                @traced("render.html")
+                def on_item(path, value):
+                    if path[0] == "MarketBenchmarks" and len(path) == 2:
+                        streamed_bm[path[1]] = _to_float(value)
+                        if {"CPA", "CR", "ROAS"} <= streamed_bm.keys():
+                            render_benchmarks(streamed_bm)
+                    elif path[0] == "Analysis":
+                        render_card(analysis_box, clean_text_ar(str(value)))
+                    elif path[0] == "Recommendations":
+                        render_card(recs_box, clean_text_ar(str(value)))
+
+                analysis_data = get_ai_analysis(field, CPA, CR, ROAS, orders, visits, on_item=on_item)
                 if analysis_data:
-                    # Benchmarks السوق
-                    st.markdown(f"""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
-                    <h3 style="color: white; text-align: center;">
-                    🔹 Benchmarks السوق السعودي ({field})
-                    </h3></div>""",     
-                    unsafe_allow_html=True )
-                    # st.markdown(f"### 🔹 Benchmarks السوق السعودي ({field})")
-                    bm = analysis_data.get("MarketBenchmarks", {})
-                    c1, c2, c3 = st.columns(3)
-                    c1.metric("CPA (متوسط السوق)", f"{bm.get('CPA', 0):.2f} ريال")
-                    c2.metric("CR (متوسط السوق)", f"{bm.get('CR', 0)*100:.2f}%")
-                    c3.metric("ROAS (متوسط السوق)", f"{bm.get('ROAS', 0):.2f}x")
-
-                    # التحليل
-                    # st.markdown("### 📊 التحليل")
-                    st.markdown("""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
-                    <h3 style="color: white; text-align: center;">📊 التحليل</h3>
-                    </div>""",     
-                    unsafe_allow_html=True )
-                    for line in analysis_data.get("Analysis", []):
-                        # st.markdown(f"- {line}")
-                        st.markdown(f"""
-                        <div style="
-                            position: relative;
-                            background: linear-gradient(135deg, rgba(255,255,255,0.1), rgba(255,255,255,0.05));
-                            backdrop-filter: blur(10px);
-                            border: 1px solid rgba(255,255,255,0.2);
-                            box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-                            border-radius: 10px;
-                            padding: 10px 14px;
-                            margin: 8px 0;
-                        ">
-                            <p style="
-                                color: #f0f0f0;
-                                font-size: 0.95rem;
-                                font-family: 'Cairo', sans-serif;
-                                line-height: 1.6;
-                                text-align: right;
-                                direction: rtl;
-                            ">🔹 {line}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    # التوصيات
-                    # st.markdown("### 📌 التوصيات العملية لتحسين الأداء")
-                    st.markdown("""<div style="position: relative; background: rgba(0, 0, 0, 0.5); backdrop-filter: blur(8px); padding: 10px; border-radius: 8px;">
-                    <h3 style="color: white; text-align: center;">📌 التوصيات العملية لتحسين الأداء</h3>
-                    </div>""",     
-                    unsafe_allow_html=True )
-                    for rec in analysis_data.get("Recommendations", []):
-                        # st.markdown(f"- {rec}")
-                        st.markdown(f"""
-                        <div style="
-                            position: relative;
-                            background: linear-gradient(135deg, rgba(255,255,255,0.1), rgba(255,255,255,0.05));
-                            backdrop-filter: blur(10px);
-                            border: 1px solid rgba(255,255,255,0.2);
-                            box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-                            border-radius: 10px;
-                            padding: 10px 14px;
-                            margin: 8px 0;
-                        ">
-                            <p style="
-                                color: #f0f0f0;
-                                font-size: 0.95rem;
-                                font-family: 'Cairo', sans-serif;
-                                line-height: 1.6;
-                                text-align: right;
-                                direction: rtl;
-                            ">🔹 {rec}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    # القيم النهائية بعد التطبيع
+                    render_benchmarks(analysis_data.get("MarketBenchmarks", {}))
 
                     # تقرير Word
                     filename = f"AI_Report_{field}_{datetime.today().strftime('%Y-%m-%d')}.docx"
-                    export_to_docx(analysis_data, filename)
-                    with open(filename, "rb") as f:
-                        st.download_button(
-                            "⬇ تنزيل تقرير السوق (Word)",
-                            data=f,
-                            file_name=filename,
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                        )
+                    st.download_button(
+                        "⬇ تنزيل تقرير السوق (Word)",
+                        data=report_download_data(export_to_docx, analysis_data),
+                        file_name=filename,
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                    )
                 else:
                     st.warning("⚠ لم نتمكن من جلب تحليل السوق من AI.")
+            except AIResponseError:
+                st.warning("⚠ لم نتمكن من جلب تحليل السوق من AI.")
+            except CircuitOpenError as e:
+                st.warning(f"⏳ {e}")
             except Exception as e:
                 st.error(f"❌ خطأ: {e}")
 
@@ -730,8 +635,8 @@ with tab4:
     with st.form("form_offline"):
         st.subheader("➕ إدخال بيانات الأوفلاين بيزنس ")
         # اختيار المجال والفئة الفرعية
-        categories = clients["Category"].dropna().unique().tolist() if "Category" in clients.columns else []
-        subcategories = clients["SubCategory"].dropna().unique().tolist() if "SubCategory" in clients.columns else []
+        categories = ref_idx["categories"]
+        subcategories = ref_idx["subcategories"]
 
         ocol1, ocol2 = st.columns(2)
         with ocol1:
@@ -771,9 +676,7 @@ with tab4:
             st.error("⚠ عدد الأوردرات لا يمكن أن يكون أكبر من عدد الزيارات.")
         else:
             # حساب المؤشرات
-            CPA = ad_budget / orders if orders > 0 else 0
-            CR  = (orders / visits) if visits > 0 else 0
-            ROAS = (orders * price) / ad_budget if ad_budget > 0 else 0
+            CPA, CR, ROAS = compute_kpi(price, ad_budget, orders, visits)
 
             # عرض النتائج
             st.markdown("### 🔹 مؤشرات العميل")
@@ -790,40 +693,60 @@ with tab4:
                 field += f" - {subcategory}"
 
             try:
+                # أماكن ثابتة لكل قسم عشان كل نقطة تظهر أول ما توصل من AI (streaming)
+                # Benchmarks السوق
+                st.markdown(f"### 🔹 Benchmarks السوق السعودي ({field})")
+                bm_box = st.empty()
+
+                # التحليل
+                st.markdown("### 📊 التحليل")
+                analysis_box = st.container()
+
+                # التوصيات
+                st.markdown("### 📌 التوصيات العملية لتحسين الأداء")
+                recs_box = st.container()
+
+                def render_benchmarks(bm):
+                    with bm_box.container():
+                        b1, b2, b3 = st.columns(3)
+                        b1.metric("CPA (متوسط السوق)", f"{bm.get('CPA', 0):.2f} ريال")
+                        b2.metric("CR (متوسط السوق)", f"{bm.get('CR', 0)*100:.2f}%")
+                        b3.metric("ROAS (متوسط السوق)", f"{bm.get('ROAS', 0):.2f}x")
+
+                streamed_bm = {}
+
+                @traced("render.html")
+                def on_item(path, value):
+                    if path[0] == "MarketBenchmarks" and len(path) == 2:
+                        streamed_bm[path[1]] = _to_float(value)
+                        if {"CPA", "CR", "ROAS"} <= streamed_bm.keys():
+                            render_benchmarks(streamed_bm)
+                    elif path[0] == "Analysis":
+                        analysis_box.markdown(f"- {clean_text_ar(str(value))}")
+                    elif path[0] == "Recommendations":
+                        recs_box.markdown(f"- {clean_text_ar(str(value))}")
+
                 # تحليل AI
-                analysis_data = get_ai_analysis(field, CPA, CR, ROAS, orders, visits)
+                analysis_data = get_ai_analysis(field, CPA, CR, ROAS, orders, visits, on_item=on_item)
 
                 if analysis_data:
-                    # Benchmarks السوق
-                    st.markdown(f"### 🔹 Benchmarks السوق السعودي ({field})")
-                    bm = analysis_data.get("MarketBenchmarks", {})
-                    b1, b2, b3 = st.columns(3)
-                    b1.metric("CPA (متوسط السوق)", f"{bm.get('CPA', 0):.2f} ريال")
-                    b2.metric("CR (متوسط السوق)", f"{bm.get('CR', 0)*100:.2f}%")
-                    b3.metric("ROAS (متوسط السوق)", f"{bm.get('ROAS', 0):.2f}x")
-
-                    # التحليل
-                    st.markdown("### 📊 التحليل")
-                    for line in analysis_data.get("Analysis", []):
-                        st.markdown(f"- {line}")
-
-                    # التوصيات
-                    st.markdown("### 📌 التوصيات العملية لتحسين الأداء")
-                    for rec in analysis_data.get("Recommendations", []):
-                        st.markdown(f"- {rec}")
+                    # القيم النهائية بعد التطبيع
+                    render_benchmarks(analysis_data.get("MarketBenchmarks", {}))
 
                     # تقرير Word
                     filename = f"AI_Report_{field}_{datetime.today().strftime('%Y-%m-%d')}.docx"
-                    export_to_docx(analysis_data, filename)
-                    with open(filename, "rb") as f:
-                        st.download_button(
-                            "⬇ تنزيل تقرير السوق (Word)",
-                            data=f,
-                            file_name=filename,
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                        )
+                    st.download_button(
+                        "⬇ تنزيل تقرير السوق (Word)",
+                        data=report_download_data(export_to_docx, analysis_data),
+                        file_name=filename,
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                    )
                 else:
                     st.warning("⚠ لم نتمكن من جلب تحليل السوق من AI.")
+            except AIResponseError:
+                st.warning("⚠ لم نتمكن من جلب تحليل السوق من AI.")
+            except CircuitOpenError as e:
+                st.warning(f"⏳ {e}")
             except Exception as e:
                 st.error(f"❌ خطأ: {e}")
 
@@ -1420,7 +1343,7 @@ with tab5:
         with r1c1:
             store_market = st.selectbox(
                 "اختر المتجر",
-                options=clients["StoreName"].unique(),
+                options=ref_idx["stores"],
                 index=None,
                 placeholder="اختر المتجر",
                 key="store_market",
@@ -1445,7 +1368,7 @@ with tab5:
                 key="country_market",
             )
         with r2c2:
-            cities = df[df['الدولة'] == country]['المنطقة'].unique()
+            cities = ref_idx["cities_by_country"].get(country, [])
             cities_options = ["None"] + list(cities)
             cities_selected = st.multiselect("اختر المدن", cities_options, key="cities_market")
 
@@ -1461,45 +1384,12 @@ with tab5:
     # بعد الفورم: تنفيذ التحليل وعرض النتائج
     if submitted:
         try:
-            row_m = clients[clients["StoreName"] == store_market].iloc[0]
+            row_m = ref_idx["store_by_name"][store_market]
             category_market = row_m.get("SubCategory") if pd.notna(row_m.get("SubCategory")) else row_m["Category"]
 
-            # ==== توليد التقرير ====
-            prompt_market = f"""
-            انت باحث تسويق متخصص في السعودية. 
-            ✅ مسموح فقط باللغة العربية المبسطة.
-            ❌ ممنوع استخدام أي كلمة أو جملة باللغة الإنجليزية.
-            ✅ لو لازم تذكر مصطلحات عالمية، اكتبها بالعربية متبوعة بالاختصار بين أقواس، مثل:
-            - معدل النمو السنوي المركب (CAGR)
-            ✅ اجعل كل جزء من التقرير في شكل قائمة مرقمة (1. ... 2. ... 3. ...).
-            ✅ كل نقطة لازم تكون جملة قصيرة ومباشرة (سطر واحد فقط).
-
-            اعطني تقرير عن السوق السعودي في مجال "{category_market}" للفئة "{btype}" 
-            في دولة {country} ومدن {selected_text}.
-
-            يجب أن يتضمن التقرير:
-            1. حجم السوق (بالريال السعودي أو عدد العملاء).
-            2. معدل النمو السنوي المركب (CAGR).
-            3. أقوى 3 منافسين حقيقيين.
-            4. تحليل SWOT (نقاط القوة، الضعف، الفرص، التهديدات) – كل قسم مرقم.
-            5. 3 توصيات عملية واضحة ومباشرة.
-
-            النتيجة لازم تكون JSON فقط بالصيغة:
-            {{
-            "MarketSize": "...",
-            "GrowthRate": 0.0,
-            "TopCompetitors": [". ...", ". ...", ". ..."],
-            "SWOT": {{"Strengths": [" ...", " ..."], "Weaknesses": [" ...", " ..."], "Opportunities": ["...", "..."], "Threats": [" ...", " ..."]}},
-            "Recommendations": ["...", "...", "..."]
-            }}
-            """
-            model = genai.GenerativeModel("models/gemini-2.5-flash")
-            response = model.generate_content(prompt_market)
-            data = _safe_parse_json(response.text or "") or {}
-
-            # ==== دالة مساعدة لإنشاء div موحد لكل قسم ====
-            def render_section(title, content_list, emoji=""):
-                st.markdown(f"""
+            # ==== دوال مساعدة لإنشاء div موحد لكل قسم ====
+            def render_section_header(box, title, emoji=""):
+                box.markdown(f"""
                 <div style="
                     margin: 0;
                     padding: 10px;
@@ -1511,60 +1401,78 @@ with tab5:
                     <h3 style="color: white; text-align: center;">{emoji} {title}</h3>
                 </div>
                 """, unsafe_allow_html=True)
-                for i, item in enumerate(content_list, 1):
-                    st.markdown(f"""
-                    <div style="
-                        margin: 5px 0;
-                        padding: 10px 14px;
-                        position: relative;
-                        background: linear-gradient(135deg, rgba(255,255,255,0.1), rgba(255,255,255,0.05));
-                        backdrop-filter: blur(10px);
-                        border: 1px solid rgba(255,255,255,0.2);
-                        box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-                        border-radius: 10px;
-                    ">
-                        <p style="
-                            color: #f0f0f0;
-                            font-size: 0.95rem;
-                            font-family: 'Cairo', sans-serif;
-                            line-height: 1.6;
-                            text-align: right;
-                            direction: rtl;
-                        ">🔹 {i}. {item}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
 
-            # حجم السوق
-            render_section("حجم السوق (تقديري)", [str(data.get("MarketSize","-"))], "📊")
-
-            # معدل النمو السنوي
-            gr = data.get("GrowthRate", "-")
-            gr_txt = f"{_to_float(gr):.2f}%" if gr != "-" else "-"
-            render_section("معدل النمو السنوي (CAGR)", [gr_txt], "📈")
-
-            # أقوى المنافسين
-            comp = data.get("TopCompetitors", []) or []
-            if comp:
-                render_section("أقوى المنافسين في السعودية", comp)
-            else:
-                st.warning("لم يتم العثور على منافسين.")
+            def render_section_item(box, i, item):
+                box.markdown(f"""
+                <div style="
+                    margin: 5px 0;
+                    padding: 10px 14px;
+                    position: relative;
+                    background: linear-gradient(135deg, rgba(255,255,255,0.1), rgba(255,255,255,0.05));
+                    backdrop-filter: blur(10px);
+                    border: 1px solid rgba(255,255,255,0.2);
+                    box-shadow: 0 2px 8px rgba(0,0,0,0.3);
+                    border-radius: 10px;
+                ">
+                    <p style="
+                        color: #f0f0f0;
+                        font-size: 0.95rem;
+                        font-family: 'Cairo', sans-serif;
+                        line-height: 1.6;
+                        text-align: right;
+                        direction: rtl;
+                    ">🔹 {i}. {item}</p>
+                </div>
+                """, unsafe_allow_html=True)
 
-            # تحليل SWOT
-            sw = data.get("SWOT", {}) or {}
-            for title, key, emoji in [("نقاط القوة", "Strengths", "✅"), 
-                                      ("نقاط الضعف", "Weaknesses", "⚠"),
-                                      ("الفرص", "Opportunities", "💡"), 
-                                      ("التهديدات", "Threats", "🚨")]:
-                render_section(title, sw.get(key, []), emoji)
+            # ==== أماكن ثابتة للأقسام بنفس ترتيب التقرير؛ كل نقطة بتظهر أول ما توصل (streaming) ====
+            sections = [
+                ("MarketSize", "حجم السوق (تقديري)", "📊"),
+                ("GrowthRate", "معدل النمو السنوي (CAGR)", "📈"),
+                ("TopCompetitors", "أقوى المنافسين في السعودية", ""),
+                ("Strengths", "نقاط القوة", "✅"),
+                ("Weaknesses", "نقاط الضعف", "⚠"),
+                ("Opportunities", "الفرص", "💡"),
+                ("Threats", "التهديدات", "🚨"),
+                ("Recommendations", "التوصيات", "📌"),
+            ]
+            boxes = {key: st.container() for key, _, _ in sections}
+            titles = {key: (title, emoji) for key, title, emoji in sections}
+            counts = {key: 0 for key in boxes}
+
+            def add_item(key, item):
+                if counts[key] == 0:
+                    render_section_header(boxes[key], *titles[key])
+                counts[key] += 1
+                render_section_item(boxes[key], counts[key], item)
+
+            @traced("render.html")
+            def on_item(path, value):
+                key = path[1] if path[0] == "SWOT" and len(path) > 1 else path[0]
+                if key not in boxes:
+                    return
+                if key == "GrowthRate":
+                    value = f"{_to_float(value):.2f}%"
+                add_item(key, str(value))
 
-            # التوصيات
-            recs = data.get("Recommendations", []) or []
-            render_section("التوصيات", recs, "📌")
+            # ==== توليد التقرير ====
+            data = get_market_report(category_market, btype, country, selected_text, on_item=on_item)
+
+            # الأقسام اللي ما وصلهاش حاجة بتتعرض زي الأول
+            if not counts["MarketSize"]:
+                add_item("MarketSize", "-")
+            if not counts["GrowthRate"]:
+                add_item("GrowthRate", "-")
+            if not counts["TopCompetitors"]:
+                boxes["TopCompetitors"].warning("لم يتم العثور على منافسين.")
+            for key in ("Strengths", "Weaknesses", "Opportunities", "Threats", "Recommendations"):
+                if not counts[key]:
+                    render_section_header(boxes[key], *titles[key])
 
             # حفظ التقرير لزر التنزيل
             file_suffix = f"{country}{''.join(cities_selected) if cities_selected else 'عام'}"
             filename = f"Market_Report_{store_market}_{btype}_{file_suffix}.docx"
-            export_market_report_to_docx(data, filename)
+            report_data = report_download_data(export_market_report_to_docx, data)
 
         except Exception as e:
             st.error(f"❌ خطأ في تحليل السوق: {e}")
@@ -1572,14 +1480,26 @@ with tab5:
     # زر التنزيل خارج الفورم
     if submitted:
         try:
-            with open(filename, "rb") as f:
-                st.download_button(
-                    "⬇ تنزيل تقرير السوق (Word)",
-                    data=f,
-                    file_name=filename,
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
+            st.download_button(
+                "⬇ تنزيل تقرير السوق (Word)",
+                data=report_data,
+                file_name=filename,
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
         except Exception as e:
             st.error(f"❌ خطأ في تنزيل التقرير: {e}")
 
-
+# ===================== توقيت المراحل و Profiler (السايدبار) =====================
+end_trace(rerun_trace)
+profile_rows = stop_profile(rerun_profiler) if rerun_profiler else None
+with st.sidebar:
+    st.toggle("⏱ عرض توقيت المراحل", key="trace_sidebar")
+    st.toggle("🔬 تشغيل كل rerun تحت Profiler", key="profile_rerun")
+    if st.session_state.get("trace_sidebar"):
+        st.caption(f"زمن الـ rerun ده: {rerun_trace.duration_ms:.0f} ms")
+        stages = stage_breakdown(rerun_trace)
+        if stages:
+            st.dataframe(pd.DataFrame(stages).round(1), hide_index=True)
+    if profile_rows:
+        st.caption("أتقل الدوال في الـ rerun ده")
+        st.dataframe(pd.DataFrame(profile_rows).round(2), hide_index=True)
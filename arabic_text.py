@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import threading
+from functools import lru_cache
+
+# ===================== إعدادات توحيد أسماء المجالات =====================
+# الجدول اللي بيتاخد منه الكتابة "الرسمية" لكل مجال (Category / SubCategory / client_category)
+FIELD_VOCAB_PATH = os.getenv("FIELD_VOCAB_PATH", "ClientsData_with_SubCategory.xlsx")
+FIELD_VOCAB_COLUMNS = ("Category", "SubCategory", "client_category")
+# ملف JSON اختياري {"الكتابة البديلة": "الكتابة الرسمية"} بيتضاف فوق القاموس الافتراضي
+FIELD_SYNONYMS_PATH = os.getenv("FIELD_SYNONYMS_PATH", "field_synonyms.json")
+
+# كتابات لاتيني/بديلة شائعة للمجالات اللي في ملف العملاء
+DEFAULT_SYNONYMS = {
+    "electronics": "إلكترونيات",
+    "clothes": "ملابس",
+    "clothing": "ملابس",
+    "fashion": "ملابس",
+    "beauty": "تجميل",
+    "cosmetics": "تجميل",
+    "makeup": "مكياج",
+    "perfume": "عطور",
+    "perfumes": "عطور",
+    "fragrances": "عطور",
+    "restaurants": "مطاعم",
+    "coffee": "قهوة",
+    "food": "أغذية",
+    "sweets": "حلويات",
+    "kids": "أطفال",
+    "baby": "أطفال",
+    "furniture": "أثاث",
+    "education": "تعليم",
+    "training": "تدريب",
+    "mobiles": "جوالات",
+    "mobile phones": "جوالات",
+    "toys": "ألعاب",
+    "pets": "حيوانات أليفة",
+    "accessories": "إكسسوارات",
+    "cars": "سيارات",
+    "car accessories": "إكسسوارات سيارات",
+    "abayas": "عبايات",
+    "books": "كتب",
+    "shoes": "أحذية",
+    "jewelry": "مجوهرات",
+    "watches": "ساعات",
+    "glasses": "نظارات",
+    "decor": "ديكور",
+    "candles": "شموع",
+    "flowers": "ورد",
+    "incense": "بخور",
+    "oud": "عود وبخور",
+    "skincare": "عناية بالبشرة",
+    "personal care": "عناية شخصية",
+    "software": "برمجيات",
+    "shipping": "شحن",
+    "logistics": "شحن ولوجستيات",
+    "ecommerce": "تجارة إلكترونية",
+    "e-commerce": "تجارة إلكترونية",
+    "dropshipping": "دروب شيبينج",
+    "drop shipping": "دروب شيبينج",
+    "دروب شيبنج": "دروب شيبينج",
+    "دروبشيبينج": "دروب شيبينج",
+}
+
+# توحيد الحروف: أشكال الألف، التاء المربوطة، الألف المقصورة، الأرقام الهندية، وحذف التطويل والتشكيل
+_CHAR_MAP = str.maketrans(
+    {
+        "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+        "ة": "ه",
+        "ى": "ي",
+        "ـ": None,
+        **{chr(c): None for c in range(0x064B, 0x0660)},
+        "ٰ": None,
+        **{chr(0x0660 + d): str(d) for d in range(10)},
+    }
+)
+# الفاصل بين أجزاء المجال: "-" أو "|" بمسافات حواليه، أو شرطة طويلة (– —).
+# الشرطة من غير مسافات جزء من الكلمة ("E-Commerce")، و "/" و "," جوه الجزء نفسه ("ملابس/أحذية")
+_SEPARATORS = re.compile(r"\s+[-|]\s+|\s*[–—]\s*")
+_SPACES = re.compile(r"\s+")
+
+_synonyms = None
+_synonyms_lock = threading.Lock()
+
+
+def normalize_chars(text):
+    """توحيد الحروف والمسافات بس (من غير قاموس المرادفات)"""
+    text = str(text).translate(_CHAR_MAP).lower()
+    return _SPACES.sub(" ", text).strip()
+
+
+def _load_vocabulary():
+    """الكتابة الرسمية لكل مجال من ملف العملاء (لو موجود)"""
+    if not os.path.exists(FIELD_VOCAB_PATH):
+        return []
+    from data_store import load_table
+
+    table = load_table(FIELD_VOCAB_PATH)
+    terms = []
+    for col in FIELD_VOCAB_COLUMNS:
+        if col in table.columns:
+            terms.extend(str(v) for v in table[col].dropna().unique())
+    return terms
+
+
+def synonyms():
+    """
+    القاموس: الشكل الموحد لأي كتابة ← الكتابة الرسمية.
+    بيتبني مرة واحدة: مصطلحات ملف العملاء، وبعدين الكتابات البديلة الافتراضية، وبعدين ملف FIELD_SYNONYMS_PATH.
+    """
+    global _synonyms
+    if _synonyms is not None:
+        return _synonyms
+    with _synonyms_lock:
+        if _synonyms is None:
+            table = {}
+            for term in _load_vocabulary():
+                table.setdefault(normalize_chars(term), term)
+            extra = {}
+            if os.path.exists(FIELD_SYNONYMS_PATH):
+                with open(FIELD_SYNONYMS_PATH, encoding="utf-8") as f:
+                    extra = json.load(f)
+            for variant, target in {**DEFAULT_SYNONYMS, **extra}.items():
+                table[normalize_chars(variant)] = table.get(normalize_chars(target), target)
+            _synonyms = table
+    return _synonyms
+
+
+def _segments(text):
+    return [s for s in _SEPARATORS.split(str(text).strip()) if s.strip()]
+
+
+def _lookup(table, text):
+    """المجال كله في القاموس الأول (زي "e-commerce")، وبعدين كل جزء لوحده"""
+    whole = normalize_chars(text)
+    if whole in table:
+        return [table[whole]]
+    return [table.get(normalize_chars(seg), seg.strip()) for seg in _segments(text)]
+
+
+@lru_cache(maxsize=4096)
+def canonical_field(text):
+    """
+    المفتاح الموحد لاسم مجال (للكاش وتجميع المجالات المتكررة):
+    كل جزء مفصول بـ " - " بيتوحد لوحده، فـ "Private Products - الكترونيات" و "private products – إلكترونيات" نفس المفتاح.
+    """
+    return " - ".join(normalize_chars(part) for part in _lookup(synonyms(), text))
+
+
+@lru_cache(maxsize=4096)
+def display_field(text):
+    """نفس اسم المجال بالكتابة الرسمية (اللي بتتبعت للموديل)"""
+    return " - ".join(_lookup(synonyms(), text))
+
+
+def canonicalize_series(series):
+    """canonical_field على عمود كامل: كل قيمة مميزة بتتحسب مرة واحدة وبعدين map"""
+    values = series.fillna("").astype(str)
+    mapping = {v: canonical_field(v) for v in values.unique()}
+    return values.map(mapping)
@@ -0,0 +1,62 @@
+import functools
+import hashlib
+import os
+import re
+import shutil
+
+# ===================== إعدادات الملفات الثابتة =====================
+STATIC_DIR = "static"          # Streamlit بيخدمه على app/static مع enableStaticServing
+STATIC_URL = "app/static"
+BG_MAX_WIDTH = int(os.getenv("BG_MAX_WIDTH", 1920))
+BG_WEBP_QUALITY = int(os.getenv("BG_WEBP_QUALITY", 80))
+
+
+@functools.lru_cache(maxsize=None)
+def _build_static_image(image_file, mtime, max_width):
+    """تجهيز الصورة مرة واحدة لكل نسخة من الملف: تصغير + WebP لو Pillow متاح"""
+    with open(image_file, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:10]
+    name, ext = os.path.splitext(os.path.basename(image_file))
+    os.makedirs(STATIC_DIR, exist_ok=True)
+
+    if ext.lower() != ".svg":
+        try:
+            from PIL import Image
+
+            out_name = f"{name}.{digest}.{max_width}.webp"
+            out_path = os.path.join(STATIC_DIR, out_name)
+            if not os.path.exists(out_path):
+                with Image.open(image_file) as img:
+                    if img.width > max_width:
+                        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+                    img.save(out_path, "WEBP", quality=BG_WEBP_QUALITY, method=6)
+            return f"{STATIC_URL}/{out_name}"
+        except ImportError:
+            pass
+
+    # بدون Pillow (أو svg): نسخة من الملف الأصلي باسم فيه الـ hash
+    out_name = f"{name}.{digest}{ext}"
+    out_path = os.path.join(STATIC_DIR, out_name)
+    if not os.path.exists(out_path):
+        shutil.copyfile(image_file, out_path)
+    return f"{STATIC_URL}/{out_name}"
+
+
+def static_image_url(image_file, max_width=BG_MAX_WIDTH):
+    """رابط static للصورة (الاسم فيه hash المحتوى عشان المتصفح يكاشه بأمان)"""
+    return _build_static_image(image_file, os.path.getmtime(image_file), max_width)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_css(file_name, mtime):
+    with open(file_name, encoding="utf-8") as f:
+        css = f.read()
+    # حذف التعليقات والمسافات الزيادة
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return css.strip()
+
+
+def load_css(file_name):
+    """قراءة ملف CSS مرة واحدة لكل بروسيس (بيتعاد لو الملف اتعدل)"""
+    return _read_css(file_name, os.path.getmtime(file_name))
@@ -0,0 +1,69 @@
+import os
+
+from arabic_text import canonical_field
+from data_store import load_table
+
+# ===================== إعدادات جدول الـ Benchmarks المحلي =====================
+# جدول بيتعدل يدويًا (Excel أو Parquet أو CSV): عمود Category + CAC/CPA و CR و ROAS (و AOV/ProfitMargin اختياري)
+BENCHMARK_TABLE_PATH = os.getenv("BENCHMARK_TABLE_PATH", "Fake_Clients_with_Benchmarks.xlsx")
+BENCHMARK_TABLE_SHEET = os.getenv("BENCHMARK_TABLE_SHEET", "SaudiBenchmarks")   # للـ Excel بس
+
+_index = {}             # "table" -> (الجدول اللي اتبنى منه, الفهرس)
+
+
+def _read_table():
+    if not os.path.exists(BENCHMARK_TABLE_PATH):
+        return None
+    if BENCHMARK_TABLE_PATH.lower().endswith((".xlsx", ".xls")):
+        return load_table(BENCHMARK_TABLE_PATH, sheet_name=BENCHMARK_TABLE_SHEET)
+    return load_table(BENCHMARK_TABLE_PATH)
+
+
+def build_index(table):
+    """المفتاح الموحد للمجال ← {CPA, CR, ROAS, ...}؛ CR كنسبة (0.02 = 2%) زي ردود الموديل"""
+    cpa_col = "CPA" if "CPA" in table.columns else "CAC"
+    index = {}
+    for record in table.to_dict("records"):
+        category = record.get("Category")
+        if not isinstance(category, str) or not category.strip():
+            continue
+        entry = {
+            "CPA": float(record[cpa_col]),
+            "CR": float(record["CR"]),
+            "ROAS": float(record["ROAS"]),
+        }
+        for extra in ("AOV", "ProfitMargin"):
+            if extra in record:
+                entry[extra] = float(record[extra])
+        index[canonical_field(category)] = entry
+    return index
+
+
+def get_index():
+    """الفهرس بيتبني مرة واحدة لكل نسخة من الجدول (load_table بيرجع نفس الـ object لحد ما الملف يتغير)"""
+    table = _read_table()
+    if table is None:
+        return {}
+    cached = _index.get("table")
+    if cached is not None and cached[0] is table:
+        return cached[1]
+    index = build_index(table)
+    _index["table"] = (table, index)
+    return index
+
+
+def lookup(field):
+    """
+    Benchmarks المجال من الجدول المحلي (أو None).
+    المجال المركب زي "Private Products - ملابس - نسائية" بيتدور عليه كامل، وبعدين كل جزء من الأخص للأعم.
+    """
+    index = get_index()
+    if not index:
+        return None
+    key = canonical_field(field)
+    if key in index:
+        return dict(index[key])
+    for part in reversed(key.split(" - ")):
+        if part in index:
+            return dict(index[part])
+    return None
@@ -0,0 +1,209 @@
+"""
+Benchmarks لأهم المسارات في التطبيق (KPI، تحليل ردود AI، تقارير Word، تحليل الـ BULK).
+الـ AI بيشتغل على الـ stub المحلي (من غير نت) وبكاش مؤقت، فالأرقام بتقيس التطبيق نفسه بس.
+
+    python benchmarks.py                          # كل الـ benchmarks ← benchmark_results.json
+    python benchmarks.py --only kpi bulk --quick  # جزء منهم بأحجام صغيرة
+    python benchmarks.py --baseline old.json      # مقارنة بنتايج نسخة سابقة
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# لازم قبل استيراد موديولات التطبيق: الإعدادات بتتقري وقت الاستيراد
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("TRACE_ENABLED", "0")
+os.environ.setdefault("AI_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_"), "ai_cache.sqlite3"))
+
+import numpy as np
+import pandas as pd
+
+from ai_cache import ai_cache
+from ai_service import _safe_parse_json, clean_text_ar, get_ai_analysis, get_ai_analysis_batch
+from bulk import run_bulk_analysis, run_bulk_batched
+from kpi import compute_kpis
+from llm_backend import StubBackend, set_backend
+from reports import export_market_report_to_docx, export_to_docx
+
+# ===================== إعدادات الـ Benchmarks =====================
+KPI_ROWS = (1_000, 10_000, 100_000)
+BULK_ROWS = 200
+BULK_WORKERS = (1, 4, 8, 16, 32)
+STUB_LATENCY = 0.05       # زمن رد الـ AI المفترض لكل طلب (ثانية)
+FIELDS = ["ملابس نسائية", "عطور", "إلكترونيات", "مستحضرات تجميل", "أدوات منزلية", "ألعاب أطفال"]
+
+
+def make_clients(rows, seed=0):
+    """ملف عملاء وهمي بنفس أعمدة الملف الحقيقي"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "المجال": rng.choice(FIELDS, rows),
+        "سعر المنتج": rng.integers(20, 500, rows),
+        "الميزانية الإعلانية": rng.integers(0, 20_000, rows),
+        "عدد الأوردرات": rng.integers(0, 400, rows),
+        "عدد الزيارات": rng.integers(0, 50_000, rows),
+    })
+
+
+def measure(fn, repeat):
+    """تشغيل fn كذا مرة؛ بيرجع أزمنة كل مرة بالثواني"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def result(name, times, items=None, unit="items/s", **params):
+    median = statistics.median(times)
+    entry = {
+        "name": name,
+        "params": params,
+        "runs": len(times),
+        "median_s": median,
+        "min_s": min(times),
+        "max_s": max(times),
+    }
+    if items:
+        entry["throughput"] = items / median if median > 0 else None
+        entry["unit"] = unit
+    return entry
+
+
+# ===================== الـ Benchmarks =====================
+def bench_kpi(quick):
+    out = []
+    for rows in KPI_ROWS[:2] if quick else KPI_ROWS:
+        base = make_clients(rows)
+        times = measure(lambda: compute_kpis(base.copy()), repeat=3 if quick else 7)
+        out.append(result("kpi.compute_kpis", times, items=rows, unit="rows/s", rows=rows))
+    return out
+
+
+def bench_parsing(quick):
+    stub = StubBackend()
+    prompts = [f'{i} "MarketBenchmarks"' for i in range(50)]
+    samples = [f"```json\n{stub.generate(p)}\n```" for p in prompts]
+    samples += ["نص مش JSON خالص", '{"CPA": 40, "CR": 2.1']
+    n = 2_000 if quick else 20_000
+    texts = (samples * (n // len(samples) + 1))[:n]
+    times = measure(lambda: [_safe_parse_json(t) for t in texts], repeat=3)
+    out = [result("ai_service._safe_parse_json", times, items=n, unit="texts/s", texts=n)]
+
+    lines = [f"{i}. تكلفة جذب العميل (CPA) أعلى من السوق بـ {i}% Market average" for i in range(n)]
+    times = measure(lambda: [clean_text_ar(line) for line in lines], repeat=3)
+    out.append(result("ai_service.clean_text_ar", times, items=n, unit="lines/s", lines=n))
+    return out
+
+
+def bench_docx(quick):
+    stub = StubBackend()
+    analysis = json.loads(stub.generate('"MarketBenchmarks"'))
+    report = json.loads(stub.generate('"MarketSize"'))
+    repeat = 5 if quick else 20
+    return [
+        result("reports.export_to_docx", measure(lambda: export_to_docx(analysis), repeat)),
+        result("reports.export_market_report_to_docx", measure(lambda: export_market_report_to_docx(report), repeat)),
+    ]
+
+
+def bench_bulk(quick):
+    rows = BULK_ROWS // 4 if quick else BULK_ROWS
+    df_clients = compute_kpis(make_clients(rows, seed=1))
+    out = []
+    for workers in BULK_WORKERS[:3] if quick else BULK_WORKERS:
+        set_backend(StubBackend(latency=STUB_LATENCY))
+        ai_cache.clear()
+        times = measure(lambda: run_bulk_analysis(df_clients, get_ai_analysis, max_workers=workers), repeat=1)
+        out.append(result(
+            "bulk.run_bulk_analysis", times, items=rows, unit="rows/s",
+            rows=rows, max_workers=workers, stub_latency_s=STUB_LATENCY,
+        ))
+
+    set_backend(StubBackend(latency=STUB_LATENCY))
+    ai_cache.clear()
+    workers = BULK_WORKERS[1]
+    times = measure(lambda: run_bulk_batched(df_clients, get_ai_analysis_batch, max_workers=workers), repeat=1)
+    out.append(result(
+        "bulk.run_bulk_batched", times, items=rows, unit="rows/s",
+        rows=rows, max_workers=workers, stub_latency_s=STUB_LATENCY,
+    ))
+    return out
+
+
+BENCHMARKS = {
+    "kpi": bench_kpi,
+    "parsing": bench_parsing,
+    "docx": bench_docx,
+    "bulk": bench_bulk,
+}
+
+
+# ===================== التشغيل وحفظ النتايج =====================
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+
+def _result_key(entry):
+    return entry["name"], json.dumps(entry["params"], sort_keys=True)
+
+
+def compare(results, baseline_path):
+    """طباعة نسبة الزمن الحالي للزمن في نتايج سابقة (> 1 يعني أبطأ)"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {_result_key(e): e for e in json.load(f)["results"]}
+    for entry in results:
+        old = baseline.get(_result_key(entry))
+        if old and old["median_s"] > 0:
+            ratio = entry["median_s"] / old["median_s"]
+            flag = "  ⚠ أبطأ" if ratio > 1.10 else ""
+            print(f"{entry['name']} {entry['params']}: {ratio:.2f}x{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks لمسارات التطبيق الأساسية")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="تشغيل benchmarks معينة بس")
+    parser.add_argument("--quick", action="store_true", help="أحجام وتكرارات أقل")
+    parser.add_argument("--output", default="benchmark_results.json", help="ملف النتايج (JSON)")
+    parser.add_argument("--baseline", help="ملف نتايج سابق للمقارنة")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.only or BENCHMARKS:
+        for entry in BENCHMARKS[name](args.quick):
+            rate = f"  ({entry['throughput']:,.0f} {entry['unit']})" if entry.get("throughput") else ""
+            print(f"{entry['name']} {entry['params']}: {entry['median_s'] * 1000:.2f} ms{rate}")
+            results.append(entry)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ النتايج اتحفظت في {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from arabic_text import canonicalize_series
+
+# ===================== إعدادات تحليل الـ BULK =====================
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", 8))
+# ميزانية التوكنز (مدخلات + مخرجات متوقعة) لكل طلب مجمّع
+AI_BATCH_TOKEN_BUDGET = int(os.getenv("AI_BATCH_TOKEN_BUDGET", 8000))
+# تقدير تقريبي لطول رد التحليل لعميل واحد بالتوكنز
+AI_BATCH_OUTPUT_TOKENS_PER_ROW = int(os.getenv("AI_BATCH_OUTPUT_TOKENS_PER_ROW", 400))
+# أقل مدة (بالثواني) بين كل تحديث لجدول النتايج الجزئية في الواجهة
+BULK_REFRESH_SECONDS = float(os.getenv("BULK_REFRESH_SECONDS", 1.0))
+
+RESULT_COLUMNS = ["Market_CPA", "Market_CR", "Market_ROAS", "Analysis", "Recommendations", "Error"]
+
+
+def _empty_result(error=""):
+    return {
+        "Market_CPA": 0.0,
+        "Market_CR": 0.0,
+        "Market_ROAS": 0.0,
+        "Analysis": "",
+        "Recommendations": "",
+        "Error": error,
+    }
+
+
+def _result_from_ai(ai_result):
+    bm = ai_result.get("MarketBenchmarks", {})
+    return {
+        "Market_CPA": bm.get("CPA", 0.0),
+        "Market_CR": bm.get("CR", 0.0),
+        "Market_ROAS": bm.get("ROAS", 0.0),
+        "Analysis": " | ".join(ai_result.get("Analysis", [])),
+        "Recommendations": " | ".join(ai_result.get("Recommendations", [])),
+        "Error": "",
+    }
+
+
+def _run_tasks(items, fn, max_workers, on_done=None):
+    """
+    تشغيل fn على كل عنصر في pool محدود والنتايج بترجع بنفس ترتيب المدخلات.
+    on_done(i, result) بتتنادي من الـ thread الأساسي أول ما أي عنصر يخلص (عشان العرض التدريجي).
+    fn لازم تمسك الأخطاء بنفسها.
+    """
+    results = [None] * len(items)
+    max_workers = max(1, min(int(max_workers or 1), len(items) or 1))
+    if max_workers == 1:
+        for i, item in enumerate(items):
+            results[i] = fn(item)
+            if on_done is not None:
+                on_done(i, results[i])
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fn, item): i for i, item in enumerate(items)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            results[i] = fut.result()
+            if on_done is not None:
+                on_done(i, results[i])
+    return results
+
+
+def analyze_row(row, analyze_fn):
+    """تحليل صف واحد؛ أي خطأ بيتسجل في الصف نفسه بدل ما يوقف الملف كله"""
+    try:
+        ai_result = analyze_fn(
+            row["المجال"], row["CPA"], row["CR"], row["ROAS"], row["عدد الأوردرات"], row["عدد الزيارات"]
+        )
+        return _result_from_ai(ai_result)
+    except Exception as e:
+        return _empty_result(f"{type(e).__name__}: {e}")
+
+
+def run_bulk_analysis(df_clients, analyze_fn, max_workers=BULK_MAX_WORKERS, on_row=None):
+    """
+    تشغيل تحليل AI لكل صفوف الملف على pool محدود من الـ threads.
+    النتايج بترجع DataFrame بنفس index وترتيب الصفوف الأصلية.
+    on_row(position, result) بتتنادي لكل صف أول ما يخلص.
+    """
+    rows = [row for _, row in df_clients.iterrows()]
+    results = _run_tasks(rows, lambda row: analyze_row(row, analyze_fn), max_workers, on_row)
+    return pd.DataFrame(results, index=df_clients.index, columns=RESULT_COLUMNS)
+
+
+def run_bulk_benchmarks(df_clients, benchmarks_fn, compare_fn, max_workers=BULK_MAX_WORKERS, on_row=None):
+    """
+    وضع Benchmarks لكل مجال: طلب AI واحد لكل قيمة مميزة في عمود المجال،
+    وبعدها المقارنة بين العميل والسوق بتتحسب محليًا لكل صف بـ compare_fn.
+    """
+    # المجالات المتكافئة (اختلاف همزات/تطويل/مسافات/لاتيني) بتتجمع على مفتاح واحد = طلب واحد
+    fields = canonicalize_series(df_clients["المجال"])
+    first_spelling = {}
+    for key, raw in zip(fields, df_clients["المجال"].fillna("").astype(str)):
+        first_spelling.setdefault(key, raw)
+    categories = list(first_spelling)
+
+    def fetch(key):
+        try:
+            return key, benchmarks_fn(first_spelling[key]), ""
+        except Exception as e:
+            return key, None, f"{type(e).__name__}: {e}"
+
+    fetched = {key: (bm, err) for key, bm, err in _run_tasks(categories, fetch, max_workers)}
+
+    def compare(row, field):
+        market, error = fetched[field]
+        if market is None:
+            return _empty_result(error)
+        try:
+            client = {"CPA": row["CPA"], "CR": row["CR"], "ROAS": row["ROAS"]}
+            analysis = compare_fn(client, market)
+            return {
+                "Market_CPA": market["CPA"],
+                "Market_CR": market["CR"],
+                "Market_ROAS": market["ROAS"],
+                "Analysis": " | ".join(analysis.splitlines()),
+                "Recommendations": "",
+                "Error": "",
+            }
+        except Exception as e:
+            return _empty_result(f"{type(e).__name__}: {e}")
+
+    results = []
+    for position, ((_, row), field) in enumerate(zip(df_clients.iterrows(), fields)):
+        results.append(compare(row, field))
+        if on_row is not None:
+            on_row(position, results[-1])
+    return pd.DataFrame(results, index=df_clients.index, columns=RESULT_COLUMNS)
+
+
+def estimate_tokens(text):
+    """تقدير سريع لعدد التوكنز (العربي بياخد توكنز أكتر من الإنجليزي لكل حرف)"""
+    return len(text) // 3 + 1
+
+
+def make_batches(clients, token_budget=AI_BATCH_TOKEN_BUDGET, output_tokens_per_row=AI_BATCH_OUTPUT_TOKENS_PER_ROW):
+    """تقسيم العملاء لمجموعات بحيث كل مجموعة ما تعديش ميزانية التوكنز (وأقل حاجة عميل واحد)"""
+    batches, current, used = [], [], 0
+    for c in clients:
+        cost = estimate_tokens(" ".join(str(v) for v in c.values())) + output_tokens_per_row
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(c)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def run_bulk_batched(df_clients, batch_fn, max_workers=BULK_MAX_WORKERS, token_budget=AI_BATCH_TOKEN_BUDGET, on_row=None):
+    """
+    وضع الطلبات المجمّعة: كذا عميل في برومبت واحد، والرد بيرجع للعميل بالـ id.
+    batch_fn بتاخد قائمة عملاء وترجع dict من id للتحليل (أو {"Error": ...} للعميل اللي فشل).
+    """
+    clients = [
+        {
+            "id": str(i),
+            "field": row["المجال"],
+            "CPA": row["CPA"],
+            "CR": row["CR"],
+            "ROAS": row["ROAS"],
+            "orders": row["عدد الأوردرات"],
+            "visits": row["عدد الزيارات"],
+        }
+        for i, (_, row) in enumerate(df_clients.iterrows())
+    ]
+    batches = make_batches(clients, token_budget)
+
+    def run_batch(batch):
+        try:
+            answers, error = batch_fn(batch), ""
+        except Exception as e:
+            answers, error = {}, f"{type(e).__name__}: {e}"
+        results = []
+        for c in batch:
+            answer = answers.get(c["id"])
+            if not answer:
+                results.append(_empty_result(error or "لا يوجد رد"))
+            elif answer.get("Error"):
+                results.append(_empty_result(answer["Error"]))
+            else:
+                results.append(_result_from_ai(answer))
+        return results
+
+    def batch_done(b, batch_results):
+        if on_row is not None:
+            for c, result in zip(batches[b], batch_results):
+                on_row(int(c["id"]), result)
+
+    outputs = _run_tasks(batches, run_batch, max_workers, batch_done)
+    results = [result for batch_results in outputs for result in batch_results]
+    return pd.DataFrame(results, index=df_clients.index, columns=RESULT_COLUMNS)
+
+
+def run_resumable(df_clients, runner, journal, completed=None, on_row=None, offset=0, **runner_kwargs):
+    """
+    تشغيل أي runner من اللي فوق مع سجل (journal): الصفوف اللي في completed ما بتتعادش،
+    وكل صف جديد بيخلص من غير خطأ بيتكتب في السجل فورًا.
+    offset: مكان أول صف في الملف كله (لما الملف بيتحلل chunk ورا chunk)؛ completed و on_row والسجل بأرقام الملف كله.
+    """
+    completed = {p - offset: r for p, r in (completed or {}).items() if offset <= p < offset + len(df_clients)}
+    for position, result in completed.items():
+        if on_row is not None:
+            on_row(offset + position, result)
+
+    pending = [p for p in range(len(df_clients)) if p not in completed]
+
+    def on_pending(i, result):
+        position = offset + pending[i]
+        if not result.get("Error"):
+            journal.append(position, result)
+        if on_row is not None:
+            on_row(position, result)
+
+    results = completed
+    if pending:
+        new = runner(df_clients.iloc[pending], on_row=on_pending, **runner_kwargs)
+        for i, position in enumerate(pending):
+            results[position] = new.iloc[i].to_dict()
+    ordered = [results[p] for p in range(len(df_clients))]
+    return pd.DataFrame(ordered, index=df_clients.index, columns=RESULT_COLUMNS)
@@ -0,0 +1,163 @@
+"""
+تحليل BULK من سطر الأوامر (من غير Streamlit) بنفس مسارات تبويب BULK: compute_kpis وبعدين runner الطريقة المختارة.
+الملف بيتقسم على كذا بروسيس، وكل بروسيس بيشغل جزءه بعدد طلبات متوازية للـ AI، ولكل جزء سجل (journal)
+فالتشغيل اللي يتقطع أو يعدي المهلة بيكمل من مكانه في المرة الجاية.
+
+    python bulk_cli.py clients.xlsx BULK_Analysis.xlsx
+    python bulk_cli.py clients.csv out.csv --mode batched --processes 4 --workers 16
+    python bulk_cli.py clients.xlsx out.xlsx --time-limit 3600     # للـ cron: أقصى ساعة وبعدها نتايج جزئية
+
+exit code: 0 = كل الصفوف نجحت، 1 = فيه صفوف فشلت، 2 = المهلة خلصت قبل ما كل الصفوف تخلص.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import pandas as pd
+
+from bulk import BULK_MAX_WORKERS, BULK_REFRESH_SECONDS, RESULT_COLUMNS, _empty_result, run_resumable
+from data_store import _read_source
+from jobs import bulk_runner
+from journal import BulkJournal, content_hash
+from kpi import compute_kpis
+
+# ===================== إعدادات تشغيل الـ BULK من سطر الأوامر =====================
+BULK_CLI_PROCESSES = int(os.getenv("BULK_CLI_PROCESSES", os.cpu_count() or 1))
+BULK_CLI_TIME_LIMIT = float(os.getenv("BULK_CLI_TIME_LIMIT", 0))   # ثواني (0 = من غير حد)
+CLI_MODES = ("rows", "batched", "categories")
+
+
+def _shard_key(upload_hash, shard, shards):
+    # السجل بيتربط بتقسيمة الملف: نفس الملف بنفس عدد البروسيسات = نفس السجلات
+    return f"{upload_hash}-{shard + 1}of{shards}"
+
+
+def run_shard(df_shard, upload_hash, shard, shards, mode, max_workers):
+    """جزء من الملف جوه بروسيس واحد (نفس run_job في jobs.py من غير ملف الحالة)"""
+    journal = BulkJournal(_shard_key(upload_hash, shard, shards), mode)
+    counters = {"done": 0, "failed": 0, "printed": 0.0}
+
+    def on_row(position, result):
+        counters["done"] += 1
+        counters["failed"] += bool(result.get("Error"))
+        now = time.time()
+        if now - counters["printed"] >= BULK_REFRESH_SECONDS * 10 or counters["done"] == len(df_shard):
+            counters["printed"] = now
+            print(f"  [جزء {shard + 1}/{shards}] {counters['done']}/{len(df_shard)} (فشل {counters['failed']})", flush=True)
+
+    runner, runner_kwargs = bulk_runner(mode)
+    return run_resumable(
+        df_shard,
+        runner,
+        journal,
+        completed=journal.load(),
+        on_row=on_row,
+        max_workers=max_workers,
+        **runner_kwargs,
+    )
+
+
+def _run_shard_args(args):
+    return run_shard(*args)
+
+
+def _from_journals(df_clients, bounds, upload_hash, mode, error):
+    """نتايج الصفوف اللي اتسجلت في السجلات لحد دلوقتي، والباقي بخطأ (لما المهلة تخلص)"""
+    results = []
+    for shard, (start, end) in enumerate(bounds):
+        completed = BulkJournal(_shard_key(upload_hash, shard, len(bounds)), mode).load()
+        results.extend(completed.get(p, _empty_result(error)) for p in range(end - start))
+    return pd.DataFrame(results, index=df_clients.index, columns=RESULT_COLUMNS)
+
+
+def analyze_file(df_clients, upload_hash, mode="rows", processes=BULK_CLI_PROCESSES, max_workers=BULK_MAX_WORKERS, time_limit=BULK_CLI_TIME_LIMIT):
+    """
+    compute_kpis وبعدين التحليل على processes بروسيس (كل واحد بـ max_workers طلب متوازي).
+    بيرجع (الجدول بأعمدة النتايج, هل خلص قبل المهلة).
+    """
+    compute_kpis(df_clients)
+    if len(df_clients) == 0:
+        # ملف فيه العناوين بس: مفيش شغل، والمخرج بيتكتب فاضي بنفس الأعمدة
+        for col in RESULT_COLUMNS:
+            df_clients[col] = pd.Series(dtype="object")
+        return df_clients, True
+    processes = max(1, min(processes, len(df_clients)))
+    step = max(1, -(-len(df_clients) // processes))
+    bounds = [(start, min(start + step, len(df_clients))) for start in range(0, len(df_clients), step)]
+    tasks = [
+        (df_clients.iloc[start:end], upload_hash, shard, len(bounds), mode, max_workers)
+        for shard, (start, end) in enumerate(bounds)
+    ]
+
+    finished = True
+    if len(tasks) == 1 and not time_limit:
+        results = run_shard(*tasks[0])
+    else:
+        # spawn: كل بروسيس بيبدأ نضيف (من غير threads أو اتصالات موروثة)، و terminate بيوقف الكل عند المهلة
+        pool = multiprocessing.get_context("spawn").Pool(len(tasks))
+        try:
+            pending = pool.map_async(_run_shard_args, tasks)
+            try:
+                results = pd.concat(pending.get(timeout=time_limit or None))
+            except multiprocessing.TimeoutError:
+                finished = False
+                pool.terminate()
+                results = _from_journals(df_clients, bounds, upload_hash, mode, "لم يكتمل قبل انتهاء المهلة")
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for col in RESULT_COLUMNS:
+        df_clients[col] = results[col].to_numpy()
+    return df_clients, finished
+
+
+def _write_output(df_clients, path):
+    if path.lower().endswith(".csv"):
+        df_clients.to_csv(path, index=False, encoding="utf-8-sig")
+    elif path.lower().endswith(".parquet"):
+        df_clients.to_parquet(path, index=False)
+    else:
+        df_clients.to_excel(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="تحليل BULK لملف عملاء من غير الواجهة")
+    parser.add_argument("input", help="ملف العملاء (xlsx / csv / parquet)")
+    parser.add_argument("output", help="ملف النتايج (xlsx / csv / parquet حسب الامتداد)")
+    parser.add_argument("--mode", choices=CLI_MODES, default="rows", help="طريقة التحليل (نفس اختيارات تبويب BULK)")
+    parser.add_argument("--processes", type=int, default=BULK_CLI_PROCESSES, help="عدد البروسيسات")
+    parser.add_argument("--workers", type=int, default=BULK_MAX_WORKERS, help="عدد طلبات الـ AI المتوازية لكل بروسيس")
+    parser.add_argument("--time-limit", type=float, default=BULK_CLI_TIME_LIMIT, help="أقصى مدة بالثواني (0 = من غير حد)")
+    args = parser.parse_args(argv)
+
+    with open(args.input, "rb") as f:
+        upload_hash = content_hash(f.read())
+    df_clients = _read_source(args.input)
+    print(f"{len(df_clients)} عميل من {args.input} ({args.mode}، {args.processes} بروسيس × {args.workers} طلب)", flush=True)
+
+    start = time.perf_counter()
+    df_clients, finished = analyze_file(
+        df_clients,
+        upload_hash,
+        mode=args.mode,
+        processes=args.processes,
+        max_workers=args.workers,
+        time_limit=args.time_limit,
+    )
+    _write_output(df_clients, args.output)
+
+    failed = int((df_clients["Error"] != "").sum())
+    print(f"\n✅ {len(df_clients) - failed} صف ← {args.output} في {time.perf_counter() - start:.1f} ثانية")
+    if not finished:
+        print("⚠ المهلة خلصت؛ التشغيل الجاي بنفس الملف وعدد البروسيسات هيكمل من السجل", file=sys.stderr)
+        sys.exit(2)
+    if failed:
+        print(f"⚠ {failed} صف فشل، التفاصيل في عمود Error", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
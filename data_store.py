@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from tracing import span
+
+# ===================== إعدادات كاش البيانات المرجعية =====================
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR", ".data_cache")
+
+_tables = {}            # path -> (stamp, DataFrame) على مستوى البروسيس
+logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _sidecar_paths(path):
+    base = os.path.join(DATA_CACHE_DIR, os.path.basename(path))
+    return base + ".meta.json", base + ".parquet", base + ".pkl"
+
+
+def _read_source(path, **read_kwargs):
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path, **read_kwargs)
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path, **read_kwargs)
+    return pd.read_excel(path, **read_kwargs)
+
+
+def _load_with_sidecar(path, stamp, **read_kwargs):
+    """قراءة الجدول من الـ sidecar العمودي لو لسه صالح، غير كده من الملف الأصلي وتحديث الـ sidecar"""
+    meta_path, parquet_path, pickle_path = _sidecar_paths(path)
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+    fmt = meta.get("format")
+    sidecar = parquet_path if fmt == "parquet" else pickle_path
+    fresh = fmt and os.path.exists(sidecar) and meta.get("read_kwargs") == read_kwargs
+    if fresh and [meta.get("mtime_ns"), meta.get("size")] != list(stamp):
+        # الملف اتلمس بس ممكن محتواه ما اتغيرش
+        digest = _file_hash(path)
+        fresh = meta.get("sha1") == digest
+        if fresh:
+            meta.update(mtime_ns=stamp[0], size=stamp[1])
+            try:
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            except OSError as e:
+                logger.warning("تعذر تحديث بيانات الـ sidecar لـ %s: %s", path, e)
+    if fresh:
+        try:
+            return pd.read_parquet(sidecar) if fmt == "parquet" else pd.read_pickle(sidecar)
+        except Exception:
+            pass  # sidecar بايظ ← نقرأ من الأصل
+
+    table = _read_source(path, **read_kwargs)
+    try:
+        _write_sidecar(path, stamp, table, read_kwargs)
+    except OSError as e:
+        # الكاش اختياري: فولدر read-only أو مفيش مساحة ← الجدول بيرجع من الأصل عادي
+        logger.warning("تعذر كتابة الـ sidecar لـ %s في %s: %s", path, DATA_CACHE_DIR, e)
+    return table
+
+
+def _write_sidecar(path, stamp, table, read_kwargs):
+    meta_path, parquet_path, pickle_path = _sidecar_paths(path)
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    try:
+        table.to_parquet(parquet_path, index=False)
+        fmt = "parquet"
+    except OSError:
+        raise
+    except Exception:
+        # أعمدة بأنواع مختلطة أو pyarrow مش متاح
+        table.to_pickle(pickle_path)
+        fmt = "pickle"
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "mtime_ns": stamp[0],
+                "size": stamp[1],
+                "sha1": _file_hash(path),
+                "format": fmt,
+                "read_kwargs": read_kwargs,
+            },
+            f,
+        )
+
+
+def load_table(path, **read_kwargs):
+    """
+    تحميل جدول مرجعي (Excel/CSV) مرة واحدة لكل بروسيس.
+    بيتعاد تحميله بس لو الملف اتغير، والقراءة الباردة بتكون من sidecar عمودي.
+    الجدول الراجع مشترك بين الجلسات، فما يتعدلش في مكانه.
+    """
+    stamp = _stamp(path)
+    key = (path, json.dumps(read_kwargs, sort_keys=True))
+    cached = _tables.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with _lock, span("data.load_table", path=path):
+        cached = _tables.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        table = _load_with_sidecar(path, stamp, **read_kwargs)
+        _tables[key] = (stamp, table)
+        return table
+
+
+_indexes = {}           # اسم الفهرس -> (الجداول اللي اتبنى منها, الفهرس)
+
+
+def _unique(series):
+    return series.dropna().unique().tolist()
+
+
+def build_reference_indexes(clients, locations):
+    """فهارس جاهزة لقوائم الاختيار والبحث (O(1)) بدل ما تتحسب في كل rerun"""
+    idx = {
+        "categories": _unique(clients["Category"]) if "Category" in clients.columns else [],
+        "subcategories": _unique(clients["SubCategory"]) if "SubCategory" in clients.columns else [],
+        "stores": _unique(clients["StoreName"]) if "StoreName" in clients.columns else [],
+        "store_by_name": {},
+        "countries": _unique(locations["الدولة"]),
+        "cities_by_country": {},
+    }
+    if "StoreName" in clients.columns:
+        # أول صف لكل متجر (زي iloc[0] على الفلترة)
+        for record in clients.drop_duplicates("StoreName").to_dict("records"):
+            idx["store_by_name"][record["StoreName"]] = record
+    pairs = locations[["الدولة", "المنطقة"]].dropna().drop_duplicates()
+    for country, city in zip(pairs["الدولة"], pairs["المنطقة"]):
+        idx["cities_by_country"].setdefault(country, []).append(city)
+    return idx
+
+
+def get_reference_indexes(clients, locations):
+    """الفهارس بتتبني مرة واحدة لكل نسخة من الجداول (load_table بيرجع نفس الـ object لحد ما الملف يتغير)"""
+    cached = _indexes.get("reference")
+    if cached is not None and cached[0][0] is clients and cached[0][1] is locations:
+        return cached[1]
+    idx = build_reference_indexes(clients, locations)
+    _indexes["reference"] = ((clients, locations), idx)
+    return idx
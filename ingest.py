@@ -0,0 +1,202 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+# ===================== إعدادات قراءة ملفات العملاء الكبيرة =====================
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 2000))     # صفوف كل chunk (الذاكرة ثابتة مهما كان حجم الملف)
+INGEST_PREVIEW_ROWS = int(os.getenv("INGEST_PREVIEW_ROWS", 20))
+BULK_OUTPUT_DIR = os.getenv("BULK_OUTPUT_DIR") or None   # مكان ملفات النتايج المؤقتة (الافتراضي: temp بتاع النظام)
+UPLOAD_TYPES = ["xlsx", "csv", "parquet"]
+
+
+def _kind(name):
+    name = name.lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith(".parquet"):
+        return "parquet"
+    return "xlsx"
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def _xlsx_chunks(source, chunk_rows):
+    """openpyxl read-only: الصفوف بتتقري من الـ XML واحد ورا التاني من غير ما الشيت كله يتحمل"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(_rewind(source), read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # نفس أسماء pandas للأعمدة اللي من غير عنوان
+        columns = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        buffer = []
+        yielded = False
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            buffer.append(row[: len(columns)])
+            if len(buffer) == chunk_rows:
+                yield pd.DataFrame.from_records(buffer, columns=columns)
+                buffer = []
+                yielded = True
+        if buffer or not yielded:
+            # شيت فيه العناوين بس: جدول فاضي بنفس الأعمدة (زي read_csv)
+            yield pd.DataFrame.from_records(buffer, columns=columns)
+    finally:
+        wb.close()
+
+
+def _parquet_chunks(source, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        # من غير pyarrow مفيش قراءة على دفعات؛ الملف بيتقري مرة واحدة ويتقسم
+        table = pd.read_parquet(_rewind(source))
+        for start in range(0, max(len(table), 1), chunk_rows):
+            yield table.iloc[start : start + chunk_rows]
+        return
+    parquet = pq.ParquetFile(_rewind(source))
+    if not parquet.metadata.num_rows:
+        yield parquet.schema_arrow.empty_table().to_pandas()
+        return
+    for batch in parquet.iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def _raw_chunks(source, name, chunk_rows):
+    """chunks الملف زي ما القارئ بيطلعها؛ ملف فيه العناوين بس بيطلع chunk فاضي بالأعمدة"""
+    kind = _kind(name)
+    if kind == "csv":
+        return pd.read_csv(_rewind(source), chunksize=chunk_rows)
+    if kind == "parquet":
+        return _parquet_chunks(source, chunk_rows)
+    return _xlsx_chunks(source, chunk_rows)
+
+
+def iter_chunks(source, name, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    ملف العملاء (xlsx / csv / parquet) كـ DataFrames صغيرة بالترتيب.
+    الـ index بيكمل من chunk للتاني (0..n-1 على الملف كله) زي ما لو الملف اتقري مرة واحدة.
+    """
+    offset = 0
+    for chunk in _raw_chunks(source, name, chunk_rows):
+        if not len(chunk):
+            continue
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+
+def read_upload(source, name):
+    """الملف كله في DataFrame واحد (للمسارات اللي محتاجة الجدول كامل زي مهام الخلفية)"""
+    chunks = list(_raw_chunks(source, name, INGEST_CHUNK_ROWS))
+    rows = [chunk for chunk in chunks if len(chunk)]
+    if rows:
+        return pd.concat(rows, ignore_index=True)
+    # ملف فيه العناوين بس: جدول فاضي بنفس الأعمدة عشان compute_kpis وملف النتايج
+    return chunks[0].reset_index(drop=True) if chunks else pd.DataFrame()
+
+
+def estimate_rows(source, name):
+    """عدد الصفوف (تقريبي) من غير قراءة الملف؛ None لو مش معروف"""
+    kind = _kind(name)
+    try:
+        if kind == "csv":
+            data = source.getvalue() if hasattr(source, "getvalue") else None
+            return max(data.count(b"\n") - 1, 0) if data is not None else None
+        if kind == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetFile(_rewind(source)).metadata.num_rows
+        from openpyxl import load_workbook
+
+        wb = load_workbook(_rewind(source), read_only=True)
+        try:
+            max_row = wb.worksheets[0].max_row
+        finally:
+            wb.close()
+        return max_row - 1 if max_row else None
+    except Exception:
+        return None
+
+
+def _cell(value):
+    # NaN/NaT → خلية فاضية
+    if value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+
+def _write_csv(f, df_chunk, header):
+    writer = csv.writer(f)
+    if header:
+        writer.writerow(df_chunk.columns)
+    writer.writerows([_cell(v) for v in row] for row in df_chunk.itertuples(index=False))
+
+
+class ResultSink:
+    """
+    نتايج الـ BULK بتتكتب على الديسك chunk ورا chunk بدل ما تتجمع في الذاكرة:
+    CSV (للتنزيل الجزئي أثناء التشغيل) و xlsx بـ openpyxl write-only (للملف النهائي).
+    كل تشغيل ليه فولدر مؤقت خاص بيه (جلستين بنفس الملف ما يكتبوش فوق بعض)، و cleanup() بتمسحه.
+    """
+
+    def __init__(self, directory=BULK_OUTPUT_DIR):
+        from openpyxl import Workbook
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix="bulk_", dir=directory)
+        self.csv_path = os.path.join(self.dir, "results.csv")
+        self.xlsx_path = os.path.join(self.dir, "results.xlsx")
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet()
+        self.rows = 0
+        self.failed = 0
+
+    def write(self, df_chunk):
+        first = self.rows == 0
+        with open(self.csv_path, "a", encoding="utf-8-sig" if first else "utf-8", newline="") as f:
+            _write_csv(f, df_chunk, header=first)
+        if first:
+            self._ws.append([str(c) for c in df_chunk.columns])
+        for row in df_chunk.itertuples(index=False):
+            self._ws.append([_cell(v) for v in row])
+        self.rows += len(df_chunk)
+        if "Error" in df_chunk.columns:
+            self.failed += int((df_chunk["Error"].fillna("") != "").sum())
+
+    def csv_bytes(self, pending=None):
+        """
+        الـ CSV لحد دلوقتي + pending (صفوف خلصت في الـ chunk الحالي ولسه ما اتكتبتش).
+        بيقرا الملف كله، فالواجهة بتناديها بس لما المستخدم يدوس تنزيل لو Streamlit بيدعم ده.
+        """
+        data = b""
+        if os.path.exists(self.csv_path):
+            with open(self.csv_path, "rb") as f:
+                data = f.read()
+        if pending is not None and len(pending):
+            text = io.StringIO()
+            _write_csv(text, pending, header=not data)
+            data += text.getvalue().encode("utf-8" if data else "utf-8-sig")
+        return data
+
+    def close(self):
+        """حفظ ملف الـ xlsx النهائي وترجيع محتواه (bytes)"""
+        self._wb.save(self.xlsx_path)
+        with open(self.xlsx_path, "rb") as f:
+            return f.read()
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
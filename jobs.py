@@ -0,0 +1,202 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from ai_service import analyze, get_ai_analysis, get_ai_analysis_batch, get_benchmarks_from_ai
+from bulk import (
+    BULK_MAX_WORKERS,
+    BULK_REFRESH_SECONDS,
+    RESULT_COLUMNS,
+    run_bulk_analysis,
+    run_bulk_batched,
+    run_bulk_benchmarks,
+    run_resumable,
+)
+from journal import BulkJournal
+
+# ===================== إعدادات مهام الـ BULK في الخلفية =====================
+JOBS_DIR = os.getenv("BULK_JOBS_DIR", ".bulk_jobs")
+JOB_PROCESSES = int(os.getenv("BULK_JOB_PROCESSES", 2))   # عدد المهام اللي بتشتغل في نفس الوقت
+JOB_RETENTION_DAYS = float(os.getenv("BULK_JOB_RETENTION_DAYS", 7))   # المهام الأقدم من كده بتتمسح بملفاتها
+
+_pool = None
+_futures = {}   # job_id -> Future للمهام اللي اتبعتت من البروسيس ده
+
+
+def bulk_runner(mode):
+    """الـ runner والـ دوال المناسبة لكل طريقة تحليل في تبويب BULK"""
+    if mode == "categories":
+        # طلب واحد لكل مجال مميز بدل طلب لكل صف
+        return run_bulk_benchmarks, {"benchmarks_fn": get_benchmarks_from_ai, "compare_fn": analyze}
+    if mode == "batched":
+        return run_bulk_batched, {"batch_fn": get_ai_analysis_batch}
+    return run_bulk_analysis, {"analyze_fn": get_ai_analysis}
+
+
+# ===================== سجل حالة المهمة =====================
+def _job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def read_status(job_id):
+    path = os.path.join(_job_dir(job_id), "status.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_status(jid, /, **changes):
+    """تحديث ملف الحالة بشكل atomic (كتابة ملف مؤقت وبعدين replace)؛ changes ممكن يكون فيها job_id نفسه"""
+    status = read_status(jid) or {}
+    status.update(changes, updated=time.time())
+    path = os.path.join(_job_dir(jid), "status.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(status, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return status
+
+
+def is_active(job_id):
+    """المهمة لسه في الـ pool (مستنية أو شغالة)"""
+    future = _futures.get(job_id)
+    return future is not None and not future.done()
+
+
+def is_interrupted(status):
+    """حالتها queued/running بس مفيش worker شغال عليها (مثلاً السيرفر اتعمله restart)"""
+    return status["state"] in ("queued", "running") and not is_active(status["job_id"])
+
+
+def list_jobs(job_ids, limit=20):
+    """
+    آخر المهام من job_ids بس (الأحدث الأول).
+    الواجهة بتبعت المهام اللي الجلسة نفسها بعتتها، فمحدش يشوف ملفات أو نتايج جلسة تانية.
+    """
+    statuses = [read_status(job_id) for job_id in dict.fromkeys(job_ids)]
+    statuses = [s for s in statuses if s]
+    return sorted(statuses, key=lambda s: s["created"], reverse=True)[:limit]
+
+
+def cleanup_jobs(max_age_days=JOB_RETENTION_DAYS):
+    """مسح المهام (المدخلات والنتايج) اللي آخر تحديث ليها أقدم من max_age_days ومش شغالة"""
+    if not os.path.isdir(JOBS_DIR):
+        return
+    cutoff = time.time() - max_age_days * 86400
+    for job_id in os.listdir(JOBS_DIR):
+        if is_active(job_id):
+            continue
+        status = read_status(job_id)
+        updated = status.get("updated", 0) if status else os.path.getmtime(_job_dir(job_id))
+        if updated < cutoff:
+            shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+
+def job_output(job_id):
+    """ملف Excel النهائي للمهمة (bytes) لو خلصت"""
+    path = os.path.join(_job_dir(job_id), "output.xlsx")
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# ===================== تشغيل المهمة (جوه بروسيس الـ worker) =====================
+def run_job(job_id):
+    status = read_status(job_id)
+    try:
+        df_clients = pd.read_pickle(os.path.join(_job_dir(job_id), "input.pkl"))
+        journal = BulkJournal(status["upload_hash"], status["mode"])
+        completed = journal.load()
+        status = _write_status(job_id, state="running", done=0, failed=0, started=time.time())
+
+        counters = {"done": 0, "failed": 0, "written": 0.0}
+
+        def on_row(position, result):
+            counters["done"] += 1
+            counters["failed"] += bool(result.get("Error"))
+            now = time.time()
+            if now - counters["written"] >= BULK_REFRESH_SECONDS:
+                counters["written"] = now
+                _write_status(job_id, done=counters["done"], failed=counters["failed"])
+
+        runner, runner_kwargs = bulk_runner(status["mode"])
+        results = run_resumable(
+            df_clients,
+            runner,
+            journal,
+            completed=completed,
+            on_row=on_row,
+            max_workers=status["max_workers"],
+            **runner_kwargs,
+        )
+        for col in RESULT_COLUMNS:
+            df_clients[col] = results[col]
+        df_clients.to_excel(os.path.join(_job_dir(job_id), "output.xlsx"), index=False)
+        _write_status(job_id, state="done", done=counters["done"], failed=counters["failed"], finished=time.time())
+    except Exception as e:
+        _write_status(job_id, state="failed", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+
+
+def _get_pool():
+    """pool بروسيسات واحد لكل بروسيس Streamlit (الموديول مش بيتعاد تحميله مع كل rerun)"""
+    global _pool
+    if _pool is None:
+        # spawn بدل fork: سيرفر Streamlit فيه threads كتير
+        _pool = ProcessPoolExecutor(max_workers=JOB_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def job_id_for(upload_hash, mode):
+    """نفس الملف بنفس الطريقة = نفس المهمة"""
+    return f"{upload_hash[:16]}-{mode}"
+
+
+def _start(job_id):
+    _futures[job_id] = _get_pool().submit(run_job, job_id)
+
+
+def resume_job(job_id):
+    """إعادة تشغيل مهمة وقفت في النص؛ الصفوف اللي في السجل ما بتتعادش"""
+    if not is_active(job_id):
+        _write_status(job_id, state="queued", error="")
+        _start(job_id)
+
+
+def submit_job(df_clients, upload_hash, mode, file_name="", max_workers=BULK_MAX_WORKERS):
+    """
+    تسجيل مهمة BULK جديدة وتشغيلها في بروسيس منفصل.
+    نفس الملف بنفس الطريقة = نفس المهمة؛ لو شغالة أو خلصت بترجع الـ id من غير إعادة تشغيل،
+    ولو وقفت في النص بتتكمل من السجل.
+    """
+    cleanup_jobs()
+    job_id = job_id_for(upload_hash, mode)
+    status = read_status(job_id)
+    if status and (status["state"] == "done" or is_active(job_id)):
+        return job_id
+
+    os.makedirs(_job_dir(job_id), exist_ok=True)
+    df_clients.to_pickle(os.path.join(_job_dir(job_id), "input.pkl"))
+    _write_status(
+        job_id,
+        job_id=job_id,
+        file_name=file_name,
+        upload_hash=upload_hash,
+        mode=mode,
+        max_workers=int(max_workers),
+        state="queued",
+        total=len(df_clients),
+        done=0,
+        failed=0,
+        created=(status or {}).get("created", time.time()),
+        error="",
+    )
+    _start(job_id)
+    return job_id
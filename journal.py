@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from ai_cache import CACHE_TTL, date_bucket
+
+# ===================== إعدادات سجل تشغيلات الـ BULK =====================
+JOURNAL_DIR = os.getenv("BULK_JOURNAL_DIR", ".bulk_journals")
+
+
+def content_hash(data):
+    """hash لمحتوى الملف المرفوع (نفس الملف = نفس السجل)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BulkJournal:
+    """
+    سجل append-only بصيغة JSONL لكل ملف مرفوع وطريقة تحليل وسلة زمنية (نفس سلة كاش الـ AI).
+    كل صف بيخلص بيتكتب فورًا على الديسك، فلو البروسيس وقع التشغيل الجاي بيكمل من مكانه؛
+    ونفس الملف لو اترفع في سلة جديدة بيتحلل من جديد بدل ما نتايجه القديمة تترجع.
+    """
+
+    def __init__(self, upload_hash, mode, directory=JOURNAL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        prune_journals(directory)
+        bucket = date_bucket() or "all"
+        self.path = os.path.join(directory, f"{upload_hash}.{mode}.{bucket}.jsonl")
+        self._lock = threading.Lock()
+
+    def load(self):
+        """الصفوف اللي خلصت قبل كده: dict من رقم الصف للنتيجة"""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    done[int(entry["row"])] = entry["result"]
+                except (ValueError, KeyError, TypeError):
+                    # آخر سطر ممكن يكون ناقص لو الكتابة اتقطعت
+                    continue
+        return done
+
+    def append(self, row, result):
+        line = json.dumps({"row": int(row), "result": result}, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def prune_journals(directory=JOURNAL_DIR, max_age=CACHE_TTL):
+    """مسح السجلات اللي ما اتكتبش فيها من أكتر من max_age ثانية (نفس TTL كاش الـ AI)"""
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue  # سجل بيتكتب أو اتمسح من بروسيس تاني
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+# ===================== أعمدة ملف العملاء =====================
+PRICE_COL = "سعر المنتج"
+BUDGET_COL = "الميزانية الإعلانية"
+ORDERS_COL = "عدد الأوردرات"
+VISITS_COL = "عدد الزيارات"
+
+
+def _safe_div(num, den):
+    """قسمة آمنة: أي مقام <= 0 نتيجته 0 بدل inf/NaN"""
+    num = np.asarray(num, dtype="float64")
+    den = np.asarray(den, dtype="float64")
+    out = np.zeros(np.broadcast(num, den).shape, dtype="float64")
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def compute_kpis_arrays(price, ad_budget, orders, visits):
+    """حساب CPA و CR و ROAS على arrays مرة واحدة (vectorized)"""
+    price = np.asarray(price, dtype="float64")
+    orders = np.asarray(orders, dtype="float64")
+    return {
+        "CPA": _safe_div(ad_budget, orders),
+        "CR": _safe_div(orders, visits),
+        "ROAS": _safe_div(orders * price, ad_budget),
+    }
+
+
+def compute_kpis(df_clients):
+    """إضافة أعمدة CPA و CR و ROAS لملف العملاء كله بدون apply صف بصف"""
+    cols = {
+        c: pd.to_numeric(df_clients[c], errors="coerce").fillna(0).to_numpy(dtype="float64")
+        for c in (PRICE_COL, BUDGET_COL, ORDERS_COL, VISITS_COL)
+    }
+    kpis = compute_kpis_arrays(cols[PRICE_COL], cols[BUDGET_COL], cols[ORDERS_COL], cols[VISITS_COL])
+    for name, values in kpis.items():
+        df_clients[name] = values
+    return df_clients
+
+
+def compute_kpi(price, ad_budget, orders, visits):
+    """نسخة لعميل واحد (لتبويبات الفورم) بنفس المعادلات"""
+    kpis = compute_kpis_arrays(price, ad_budget, orders, visits)
+    return float(kpis["CPA"]), float(kpis["CR"]), float(kpis["ROAS"])
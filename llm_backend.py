@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from resilience import AI_CALL_DEADLINE
+from tracing import add_attrs
+
+# ===================== إعدادات الـ Backend بتاع الـ AI =====================
+# Load environment variables from .env file
+load_dotenv()
+# gemini (الافتراضي) | stub (رد محلي ثابت بدون نت) | record (Gemini + تسجيل الردود) | replay (الردود المسجلة بس)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "models/gemini-2.5-flash")
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", ".llm_recordings.jsonl")
+# إعدادات الـ stub: زمن الرد بالثواني (+ تذبذب عشوائي ثابت) ونسبة الطلبات اللي بتفشل عمدًا
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", 0.0))
+LLM_STUB_JITTER = float(os.getenv("LLM_STUB_JITTER", 0.0))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", 0.0))
+LLM_STUB_SEED = os.getenv("LLM_STUB_SEED", "0")
+
+
+class LLMBackendError(RuntimeError):
+    """فشل من الـ backend نفسه (فشل متعمد من الـ stub أو رد مش مسجل في وضع replay)"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _prompt_hash(prompt):
+    """hash للبرومبت من غير سطر التاريخ (عشان التسجيلات تفضل صالحة في الأيام اللي بعدها)"""
+    lines = [line.strip() for line in prompt.strip().splitlines() if not line.strip().startswith("التاريخ:")]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def _record_usage(response):
+    """عدد التوكنز من usage_metadata بتاع رد Gemini على الـ span الحالي"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    add_attrs(
+        prompt_tokens=getattr(usage, "prompt_token_count", 0),
+        output_tokens=getattr(usage, "candidates_token_count", 0),
+        total_tokens=getattr(usage, "total_token_count", 0),
+    )
+
+
+def _generation_config(schema):
+    """structured output: الرد JSON بس وعلى الـ schema بالظبط (من غير ```json ولا كلام زيادة)"""
+    if schema is None:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+class GeminiBackend:
+    """الـ backend الحقيقي: Google Generative AI"""
+
+    def __init__(self, model_name=LLM_MODEL):
+        import google.generativeai as genai
+
+        # Configure the Gemini client
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, schema=None):
+        response = self._model.generate_content(
+            prompt,
+            generation_config=_generation_config(schema),
+            request_options={"timeout": AI_CALL_DEADLINE},
+        )
+        _record_usage(response)
+        return response.text or ""
+
+    def stream(self, prompt, schema=None):
+        """الرد على دفعات نصية أول بأول"""
+        response = self._model.generate_content(
+            prompt,
+            generation_config=_generation_config(schema),
+            stream=True,
+            request_options={"timeout": AI_CALL_DEADLINE},
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # chunk من غير نص (مثلاً آخر chunk فيه finish_reason بس)
+                continue
+            if text:
+                yield text
+        # آخر chunk فيه إجمالي التوكنز
+        _record_usage(response)
+
+
+class StubBackend:
+    """
+    backend محلي من غير نت لقياس أداء التطبيق نفسه.
+    الرد ثابت لنفس البرومبت وبنفس شكل JSON اللي كل برومبت طالبه،
+    مع زمن رد وفشل متعمد قابلين للضبط (ثابتين هما كمان لنفس البرومبت ونفس رقم المحاولة).
+    """
+
+    def __init__(self, latency=LLM_STUB_LATENCY, jitter=LLM_STUB_JITTER, failure_rate=LLM_STUB_FAILURE_RATE, seed=LLM_STUB_SEED):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.seed = str(seed)
+        self.calls = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _draw(self, digest, attempt, salt):
+        """رقم ثابت بين 0 و 1 لنفس البرومبت والمحاولة"""
+        h = hashlib.sha256(f"{self.seed}:{digest}:{attempt}:{salt}".encode()).digest()
+        return int.from_bytes(h[:8], "big") / 2**64
+
+    def _number(self, digest, salt, low, high):
+        return round(low + self._draw(digest, 0, salt) * (high - low), 2)
+
+    def _response(self, prompt, digest):
+        def analysis(key):
+            return {
+                "MarketBenchmarks": {
+                    "CPA": self._number(key, "CPA", 20, 120),
+                    "CR": self._number(key, "CR", 0.5, 5),
+                    "ROAS": self._number(key, "ROAS", 1, 6),
+                },
+                "Analysis": ["1. تكلفة جذب العميل (CPA) أعلى من متوسط السوق ⚠", "2. معدل التحويل (CR) قريب من السوق ✅"],
+                "Recommendations": ["1. تحسين صفحة المنتج", "2. إعادة توزيع الميزانية الإعلانية", "3. اختبار عروض جديدة"],
+            }
+
+        if '"MarketSize"' in prompt:
+            data = {
+                "MarketSize": f"{self._number(digest, 'size', 1, 50)} مليار ريال",
+                "GrowthRate": self._number(digest, "growth", 2, 15),
+                "TopCompetitors": ["1. منافس أول", "2. منافس ثاني", "3. منافس ثالث"],
+                "SWOT": {
+                    "Strengths": ["1. طلب متزايد"],
+                    "Weaknesses": ["1. منافسة سعرية"],
+                    "Opportunities": ["1. التجارة الإلكترونية"],
+                    "Threats": ["1. تغير سلوك المستهلك"],
+                },
+                "Recommendations": ["1. التركيز على الجودة", "2. الاستثمار في التسويق الرقمي", "3. بناء ولاء العملاء"],
+            }
+        elif "- id=" in prompt:
+            ids = re.findall(r"- id=(\S+) \|", prompt)
+            data = [dict(analysis(f"{digest}:{i}"), id=i) for i in ids]
+        elif '"MarketBenchmarks"' in prompt:
+            data = analysis(digest)
+        else:
+            data = {
+                "CPA": self._number(digest, "CPA", 20, 120),
+                "CR": self._number(digest, "CR", 0.5, 5),
+                "ROAS": self._number(digest, "ROAS", 1, 6),
+            }
+        return json.dumps(data, ensure_ascii=False)
+
+    def generate(self, prompt, schema=None):
+        # الرد دايمًا JSON على نفس شكل البرومبت، فالـ schema مش محتاجها
+        digest = _prompt_hash(prompt)
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        delay = self.latency + self.jitter * self._draw(digest, attempt, "latency")
+        if delay > 0:
+            time.sleep(delay)
+        if self.failure_rate and self._draw(digest, attempt, "failure") < self.failure_rate:
+            raise LLMBackendError(f"stub: فشل متعمد (محاولة {attempt + 1})", retryable=True)
+        return self._response(prompt, digest)
+
+    def stream(self, prompt, schema=None, chunk_size=64):
+        text = self.generate(prompt)
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+
+
+class RecordReplayBackend:
+    """
+    record: بيبعت للـ backend الحقيقي ويسجل كل رد في ملف JSONL.
+    replay: بيرجع الردود المسجلة بس (من غير نت)؛ أي برومبت مش مسجل بيطلع LLMBackendError.
+    """
+
+    def __init__(self, mode, path=LLM_RECORD_PATH, inner=None):
+        self.mode = mode
+        self.path = path
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._recorded = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._recorded[entry["prompt_hash"]] = entry["text"]
+                    except (ValueError, KeyError, TypeError):
+                        continue
+
+    def _record(self, digest, prompt, text):
+        line = json.dumps({"prompt_hash": digest, "prompt": prompt, "text": text}, ensure_ascii=False)
+        with self._lock:
+            self._recorded[digest] = text
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def generate(self, prompt, schema=None):
+        digest = _prompt_hash(prompt)
+        if self.mode == "replay":
+            if digest not in self._recorded:
+                raise LLMBackendError(f"replay: مفيش رد مسجل للبرومبت ده ({digest[:12]})")
+            return self._recorded[digest]
+        text = self.inner.generate(prompt, schema=schema)
+        self._record(digest, prompt, text)
+        return text
+
+    def stream(self, prompt, schema=None):
+        digest = _prompt_hash(prompt)
+        if self.mode == "replay":
+            text = self.generate(prompt)
+            for i in range(0, len(text), 64):
+                yield text[i:i + 64]
+            return
+        parts = []
+        for text in self.inner.stream(prompt, schema=schema):
+            parts.append(text)
+            yield text
+        self._record(digest, prompt, "".join(parts))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(name=LLM_BACKEND):
+    if name == "stub":
+        return StubBackend()
+    if name == "replay":
+        return RecordReplayBackend("replay")
+    if name == "record":
+        return RecordReplayBackend("record", inner=GeminiBackend())
+    return GeminiBackend()
+
+
+def get_backend():
+    """الـ backend المستخدم في كل طلبات الـ AI (بيتعمل مرة واحدة لكل بروسيس)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = make_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """تبديل الـ backend (للـ benchmarks والتشغيل من غير نت)؛ بيرجع القديم"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
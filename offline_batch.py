@@ -0,0 +1,147 @@
+import json
+
+import pandas as pd
+
+from ai_cache import ai_cache, make_cache_key
+from ai_schemas import ANALYSIS_SCHEMA
+from ai_service import (
+    AIResponseError,
+    _analysis_cache_key,
+    _reference_benchmarks,
+    _with_known_benchmarks,
+    build_analysis_prompt,
+    parse_analysis_response,
+)
+from bulk import RESULT_COLUMNS, _empty_result, _result_from_ai
+
+# ===================== وضع الدفعات (Batch) بملفات JSONL =====================
+# ملف الطلبات بصيغة Gemini Batch API: سطر لكل عميل {"key": ..., "request": {"contents": [...]}}
+# ملف الردود بيتقبل بصيغة مخرجات Gemini Batch أو صيغة مبسطة {"key": ..., "text": ...} (تشغيل محلي بديل)
+
+
+def _row_inputs(row):
+    return (
+        row["المجال"],
+        float(row["CPA"]),
+        float(row["CR"]),
+        float(row["ROAS"]),
+        row["عدد الأوردرات"],
+        row["عدد الزيارات"],
+    )
+
+
+def _request_key(position, inputs, reference):
+    """
+    id ثابت لكل صف: رقم الصف + hash للمدخلات (لو الملف اتعدل بعد التصدير الرد القديم ما يتدمجش غلط)
+    + hash للمؤشرات المرجعية اللي اتبعتت في البرومبت (عشان الدمج يعرف الرد اتعمل بأنهي Benchmarks).
+    """
+    field, CPA, CR, ROAS, orders, visits = inputs
+    digest = make_cache_key(
+        "batch-request",
+        bucket="none",
+        field=field,
+        CPA=f"{CPA:.2f}",
+        CR=f"{CR*100:.2f}",
+        ROAS=f"{ROAS:.2f}",
+        orders=orders,
+        visits=visits,
+    )
+    reference_digest = make_cache_key("batch-reference", bucket="none", reference=reference)
+    return f"row-{position}-{digest[:16]}-{reference_digest[:8]}"
+
+
+def export_batch_requests(df_clients):
+    """ملف requests.jsonl (bytes) فيه برومبت التحليل لكل صف؛ df_clients لازم يكون فيه CPA/CR/ROAS"""
+    lines = []
+    for position, row in enumerate(df_clients.to_dict("records")):
+        inputs = _row_inputs(row)
+        reference, _ = _reference_benchmarks(inputs[0])
+        lines.append(json.dumps(
+            {
+                "key": _request_key(position, inputs, reference),
+                "request": {
+                    "contents": [{"role": "user", "parts": [{"text": build_analysis_prompt(*inputs, reference)}]}],
+                    "generation_config": {"response_mime_type": "application/json", "response_schema": ANALYSIS_SCHEMA},
+                },
+            },
+            ensure_ascii=False,
+            default=str,
+        ))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _response_text(entry):
+    """نص الرد من سطر في ملف الردود؛ بيرجع (text, error)"""
+    if entry.get("error"):
+        error = entry["error"]
+        return "", error.get("message", str(error)) if isinstance(error, dict) else str(error)
+    if isinstance(entry.get("text"), str):
+        return entry["text"], ""
+    try:
+        parts = entry["response"]["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return "", "رد من غير محتوى"
+    return "".join(p.get("text", "") for p in parts if isinstance(p, dict)), ""
+
+
+def read_batch_responses(data):
+    """key -> سطر الرد من ملف responses.jsonl (السطور البايظة بتتجاهل)"""
+    responses = {}
+    for line in data.decode("utf-8-sig").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and entry.get("key"):
+            responses[entry["key"]] = entry
+    return responses
+
+
+def ingest_batch_responses(df_clients, data):
+    """
+    دمج ملف الردود مع صفوف العملاء؛ بترجع DataFrame بأعمدة RESULT_COLUMNS بنفس index الملف.
+    كل رد سليم بيتحفظ في كاش الـ AI كمان، فالتحليل التفاعلي لنفس العميل بعد كده ما يطلبش الموديل تاني.
+    الصفوف اللي ملهاش رد بتتكمل من الكاش لو موجودة، غير كده بيتكتب السبب في عمود Error.
+    """
+    responses = read_batch_responses(data)
+    # نفس الصف بنفس المدخلات بس بمؤشرات مرجعية غير الحالية (الكاش اتسخن أو الجدول اتعدل بعد التصدير)
+    by_row = {key.rsplit("-", 1)[0]: entry for key, entry in responses.items()}
+    results = []
+    for position, row in enumerate(df_clients.to_dict("records")):
+        inputs = _row_inputs(row)
+        reference, tier = _reference_benchmarks(inputs[0])
+        cache_key = _analysis_cache_key(*inputs, reference)
+        key = _request_key(position, inputs, reference)
+        entry = responses.get(key)
+        if entry is None:
+            # (أو ملف اتصدّر قبل ما المؤشرات المرجعية تدخل في الـ key)
+            entry = by_row.get(key.rsplit("-", 1)[0]) or responses.get(key.rsplit("-", 1)[0])
+            if entry is not None:
+                # الرد اتعمل بمؤشرات مش معروفة دلوقتي: بيتعرض بـ Benchmarks الموديل وما بيتخزنش في الكاش
+                cache_key, reference, tier = None, None, None
+        if entry is None:
+            cached = ai_cache.get(cache_key)
+            if cached is not None:
+                results.append(_result_from_ai(_with_known_benchmarks(cached, reference, tier)))
+            else:
+                results.append(_empty_result("مفيش رد للصف ده في ملف الردود"))
+            continue
+        text, error = _response_text(entry)
+        if error:
+            results.append(_empty_result(error))
+            continue
+        try:
+            ai_result = parse_analysis_response(text)
+        except AIResponseError as e:
+            results.append(_empty_result(str(e)))
+            continue
+        if not (ai_result["Analysis"] or ai_result["Recommendations"]):
+            results.append(_empty_result("رد غير مفهوم من AI"))
+            continue
+        if cache_key is not None:
+            ai_cache.set(cache_key, ai_result)
+        results.append(_result_from_ai(_with_known_benchmarks(ai_result, reference, tier)))
+    return pd.DataFrame(results, columns=RESULT_COLUMNS, index=df_clients.index)
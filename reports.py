@@ -0,0 +1,120 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from docx import Document
+
+from tracing import span
+
+# ===================== إعدادات كاش التقارير =====================
+REPORT_CACHE_MAX = 64   # عدد التقارير المحفوظة في الذاكرة لكل بروسيس
+
+_report_cache = OrderedDict()
+_report_lock = threading.Lock()
+
+
+def _docx_bytes(doc):
+    """حفظ المستند في الذاكرة بدل ملف على الديسك"""
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def export_to_docx(analysis_data):
+    """تحويل تحليل الدروب شوبينج والتوصيات إلى Word (بيرجع bytes جاهزة لزر التنزيل)"""
+    doc = Document()
+    doc.add_heading("📑 تقرير السوق (تحليل AI)", 0)
+
+    # Benchmarks السوق
+    doc.add_heading("📊 Benchmarks السوق", level=1)
+    bm = analysis_data.get("MarketBenchmarks", {})
+    doc.add_paragraph(f"CPA (تكلفة الاكتساب) = {bm.get('CPA', 0):.2f} ريال")
+    doc.add_paragraph(f"CR (معدل التحويل) = {bm.get('CR', 0)*100:.2f}%")
+    doc.add_paragraph(f"ROAS (العائد على الإعلان) = {bm.get('ROAS', 0):.2f}x")
+
+    # التحليل
+    doc.add_heading("📊 التحليل", level=1)
+    for line in analysis_data.get("Analysis", []):
+        doc.add_paragraph(f"• {line}")
+
+    # التوصيات
+    doc.add_heading("📌 التوصيات العملية", level=1)
+    for rec in analysis_data.get("Recommendations", []):
+        doc.add_paragraph(f"- {rec}")
+
+    return _docx_bytes(doc)
+
+
+# ====== دالة لتصدير تقرير السوق العام كـ Word (تبويب 5) ======
+def export_market_report_to_docx(data):
+    doc = Document()
+
+    # العنوان الرئيسي
+    doc.add_heading("📑 تقرير السوق", 0)
+
+    # حجم السوق
+    doc.add_heading("📊 حجم السوق (تقديري)", level=1)
+    doc.add_paragraph(str(data.get("MarketSize", "-")))
+
+    # معدل النمو السنوي
+    doc.add_heading("📈 معدل النمو السنوي (CAGR)", level=1)
+    gr = data.get("GrowthRate", "-")
+    gr_txt = f"{gr:.2f}%" if isinstance(gr, (int, float)) else str(gr)
+    doc.add_paragraph(gr_txt)
+
+    # المنافسين
+    doc.add_heading("🏆 أقوى المنافسين في السعودية", level=1)
+    comp = data.get("TopCompetitors", []) or []
+    for i, c in enumerate(comp, 1):
+        doc.add_paragraph(f"{i}. {c}")
+
+    # تحليل SWOT
+    doc.add_heading("🔍 تحليل SWOT", level=1)
+    sw = data.get("SWOT", {}) or {}
+
+    doc.add_heading("✅ نقاط القوة", level=2)
+    for s in sw.get("Strengths", []) or []:
+        doc.add_paragraph(f"• {s}")
+
+    doc.add_heading("⚠ نقاط الضعف", level=2)
+    for w in sw.get("Weaknesses", []) or []:
+        doc.add_paragraph(f"• {w}")
+
+    doc.add_heading("💡 الفرص", level=2)
+    for o in sw.get("Opportunities", []) or []:
+        doc.add_paragraph(f"• {o}")
+
+    doc.add_heading("🚨 التهديدات", level=2)
+    for t in sw.get("Threats", []) or []:
+        doc.add_paragraph(f"• {t}")
+
+    # التوصيات
+    doc.add_heading("📌 التوصيات", level=1)
+    for r in data.get("Recommendations", []) or []:
+        doc.add_paragraph(f"• {r}")
+
+    return _docx_bytes(doc)
+
+
+def _data_digest(data):
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_report_cached(builder, data):
+    """بناء التقرير مرة واحدة لكل محتوى (hash للبيانات)؛ نفس التحليل بيرجع نفس الـ bytes"""
+    key = (builder.__name__, _data_digest(data))
+    with _report_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key]
+    with span("docx.export", builder=builder.__name__):
+        content = builder(data)
+    with _report_lock:
+        _report_cache[key] = content
+        _report_cache.move_to_end(key)
+        while len(_report_cache) > REPORT_CACHE_MAX:
+            _report_cache.popitem(last=False)
+    return content
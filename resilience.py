@@ -0,0 +1,291 @@
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tracing import add_attrs
+
+# ===================== إعدادات مرونة طلبات الـ AI =====================
+AI_CALL_DEADLINE = float(os.getenv("AI_CALL_DEADLINE", 90))          # أقصى زمن لكل محاولة (ثانية)؛ في الـ stream: أقصى انتظار لأي دفعة
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 3))                 # محاولات إضافية للأخطاء المؤقتة
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", 1.0))
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", 20.0))
+# لو أول رد اتأخر أكتر من كده بيتبعت طلب مكرر وأسرع واحد بيكسب (0 = من غير)؛ للتبويبات التفاعلية بس
+AI_HEDGE_AFTER = float(os.getenv("AI_HEDGE_AFTER", 0))
+AI_CIRCUIT_FAILURES = int(os.getenv("AI_CIRCUIT_FAILURES", 5))       # أخطاء متتالية تفتح الـ circuit
+AI_CIRCUIT_RESET_SECONDS = float(os.getenv("AI_CIRCUIT_RESET_SECONDS", 30))
+
+# أخطاء google.api_core المؤقتة (بالاسم عشان ما نعتمدش على استيرادها)
+_RETRYABLE_ERRORS = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "GatewayTimeout",
+    "DeadlineExceeded",
+    "Aborted",
+    "RetryError",
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """الـ API فيه مشكلة دلوقتي؛ الطلب اترفض فورًا من غير ما يتبعت"""
+
+
+class CallDeadlineExceeded(TimeoutError):
+    """الطلب عدى المهلة المسموحة"""
+
+
+def is_retryable(exc):
+    if isinstance(exc, CircuitOpenError):
+        return False
+    retryable = getattr(exc, "retryable", None)
+    if retryable is not None:
+        return bool(retryable)
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return type(exc).__name__ in _RETRYABLE_ERRORS
+
+
+def backoff_delay(attempt, base=AI_BACKOFF_BASE, cap=AI_BACKOFF_MAX):
+    """exponential backoff مع full jitter (عشان الطلبات المتوازية ما ترجعش كلها في نفس اللحظة)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    بعد عدد أخطاء مؤقتة متتالية الـ circuit بيتفتح وكل الطلبات بتفشل فورًا،
+    وبعد مدة بيسمح بطلب تجريبي واحد (half-open): لو نجح بيتقفل تاني.
+    """
+
+    def __init__(self, failures=AI_CIRCUIT_FAILURES, reset_seconds=AI_CIRCUIT_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._count = 0
+        self._opened = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self._opened)
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+                return
+            raise CircuitOpenError(f"خدمة الـ AI متعطلة مؤقتًا، حاول بعد {max(remaining, 1):.0f} ثانية")
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self._count = 0
+
+    def failure(self):
+        with self._lock:
+            self._count += 1
+            if self.state == "half_open" or self._count >= self.failures:
+                self.state = "open"
+                self._opened = time.monotonic()
+
+    def abandoned(self):
+        """الطلب اتساب من غير نتيجة؛ لو كان الطلب التجريبي الـ circuit بيرجع open عشان طلب تجريبي تاني يتسمح بعد المدة"""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened = time.monotonic()
+
+    def settle(self, outcome):
+        """نتيجة الطلب اللي عدى allow(): "success" أو "failure" أو "abandoned" (لازم واحدة منهم دايمًا)"""
+        if outcome == "success":
+            self.success()
+        elif outcome == "failure":
+            self.failure()
+        else:
+            self.abandoned()
+
+
+breaker = CircuitBreaker()
+
+
+class RateLimiter:
+    """
+    token bucket مشترك بين الـ threads: rate طلب في الثانية بالمتوسط، و burst طلبات ممكن تتبعت مرة واحدة.
+    acquire() بتستنى لحد ما يبقى فيه token.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("AI_CALL_THREADS", 64)), thread_name_prefix="ai-call")
+
+
+def _submit(fn):
+    # نسخة من الـ context عشان الـ spans/التوكنز تتسجل على الـ span بتاع الطالب
+    return _pool.submit(contextvars.copy_context().run, fn)
+
+
+def _attempt(fn, deadline, hedge_after):
+    """
+    محاولة واحدة بمهلة؛ مع hedging بيتبعت طلب مكرر لو الأول اتأخر وأول رد ناجح بيكسب.
+    من غير hedging الطلب بيتنفذ في نفس الـ thread (المهلة هنا بتاعة الـ backend نفسه)،
+    عشان طلبات الـ BULK ما تستناش في طابور الـ pool المشترك والانتظار يتحسب من مهلتها.
+    """
+    if not hedge_after:
+        return fn()
+    start = time.monotonic()
+    pending = {_submit(fn)}
+    hedged = False
+    error = None
+    while pending:
+        elapsed = time.monotonic() - start
+        if elapsed >= deadline:
+            # اللي لسه في الطابور ما يتبعتش للموديل على الفاضي
+            for future in pending:
+                future.cancel()
+            raise CallDeadlineExceeded(f"الطلب عدى المهلة ({deadline:.0f} ثانية)")
+        timeout = deadline - elapsed if hedged else min(deadline, hedge_after) - elapsed
+        done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if not done and not hedged:
+            hedged = True
+            add_attrs(hedged=True)
+            pending.add(_submit(fn))
+    raise error
+
+
+def call_with_retries(fn, hedge_after=0, deadline=AI_CALL_DEADLINE, retries=AI_MAX_RETRIES):
+    """
+    تنفيذ طلب AI (fn من غير arguments) بمهلة و retries بـ backoff للأخطاء المؤقتة،
+    وكله ورا الـ circuit breaker المشترك.
+    """
+    for attempt in range(retries + 1):
+        breaker.allow()
+        outcome = "abandoned"
+        try:
+            result = _attempt(fn, deadline, hedge_after)
+            outcome = "success"
+        except Exception as e:
+            if not is_retryable(e):
+                # الـ API رد بخطأ يخص الطلب نفسه (400، replay miss...)، فالخدمة نفسها شغالة
+                outcome = "success"
+                raise
+            outcome = "failure"
+            if attempt == retries:
+                raise
+        finally:
+            breaker.settle(outcome)
+        if outcome == "success":
+            return result
+        add_attrs(retries=attempt + 1)
+        time.sleep(backoff_delay(attempt))
+
+
+def _pump(source, open_stream, events, cancel):
+    try:
+        for text in open_stream():
+            if cancel.is_set():
+                return
+            events.put((source, "chunk", text))
+        events.put((source, "end", None))
+    except Exception as e:
+        events.put((source, "error", e))
+
+
+def _hedged_stream(open_stream, deadline, hedge_after):
+    """أول stream يبعت دفعة بيكسب والباقي بيتلغي؛ المهلة على الانتظار بين كل دفعة والتانية"""
+    events = queue.Queue()
+    cancel = threading.Event()
+    sources = 0
+    winner, errors = None, []
+
+    def start():
+        nonlocal sources
+        ctx = contextvars.copy_context()
+        threading.Thread(target=ctx.run, args=(_pump, sources, open_stream, events, cancel), daemon=True).start()
+        sources += 1
+
+    start()
+    try:
+        while True:
+            wait_for = deadline
+            if winner is None and hedge_after and sources == 1:
+                wait_for = min(deadline, hedge_after)
+            try:
+                source, kind, value = events.get(timeout=wait_for)
+            except queue.Empty:
+                if winner is None and hedge_after and sources == 1 and wait_for < deadline:
+                    add_attrs(hedged=True)
+                    start()
+                    continue
+                raise CallDeadlineExceeded(f"مفيش رد من الموديل خلال {deadline:.0f} ثانية")
+            if winner is None and kind != "error":
+                winner = source
+            if source != winner:
+                if kind == "error":
+                    errors.append(value)
+                    if len(errors) == sources:
+                        raise errors[0]
+                continue
+            if kind == "chunk":
+                yield value
+            elif kind == "end":
+                return
+            else:
+                raise value
+    finally:
+        cancel.set()
+
+
+def resilient_stream(open_stream, hedge_after=0, deadline=AI_CALL_DEADLINE, retries=AI_MAX_RETRIES):
+    """
+    نفس call_with_retries لكن لرد stream (open_stream بترجع iterator دفعات نصية).
+    الإعادة بتحصل بس لو مفيش ولا دفعة وصلت (غير كده الجزء اللي اتعرض هيتكرر).
+    """
+    for attempt in range(retries + 1):
+        breaker.allow()
+        started = False
+        outcome = "abandoned"
+        try:
+            for text in _hedged_stream(open_stream, deadline, hedge_after):
+                started = True
+                yield text
+            outcome = "success"
+        except Exception as e:
+            if not is_retryable(e):
+                outcome = "success"
+                raise
+            outcome = "failure"
+            if started or attempt == retries:
+                raise
+        finally:
+            # المستهلك ساب الـ stream (GeneratorExit) بعد ما الرد بدأ يوصل = الـ API شغال
+            if outcome == "abandoned" and started:
+                outcome = "success"
+            breaker.settle(outcome)
+        if outcome == "success":
+            return
+        add_attrs(retries=attempt + 1)
+        time.sleep(backoff_delay(attempt))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# موديولات التطبيق في جذر الريبو
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# من غير نت ولا ملفات traces أثناء التست
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("LLM_STUB_LATENCY", "0")
+os.environ.setdefault("TRACE_ENABLED", "0")
@@ -0,0 +1,38 @@
+import pytest
+
+import arabic_text
+from arabic_text import canonical_field, display_field
+
+
+@pytest.fixture(autouse=True)
+def default_synonyms(tmp_path, monkeypatch):
+    # القاموس الافتراضي بس، من غير ملف العملاء أو ملف المرادفات
+    monkeypatch.setattr(arabic_text, "FIELD_VOCAB_PATH", str(tmp_path / "missing.xlsx"))
+    monkeypatch.setattr(arabic_text, "FIELD_SYNONYMS_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(arabic_text, "_synonyms", None)
+    canonical_field.cache_clear()
+    display_field.cache_clear()
+    yield
+    canonical_field.cache_clear()
+    display_field.cache_clear()
+
+
+def test_hyphenated_synonym_matches():
+    assert canonical_field("E-Commerce") == canonical_field("تجارة إلكترونية")
+    assert display_field("e-commerce") == "تجارة إلكترونية"
+
+
+def test_hyphenated_name_is_not_split():
+    assert display_field("Wi-Fi Routers") == "Wi-Fi Routers"
+    assert canonical_field("Private Products - Wi-Fi Routers") == "private products - wi-fi routers"
+
+
+def test_slash_and_comma_stay_inside_the_segment():
+    assert display_field("ملابس/أحذية") == "ملابس/أحذية"
+    assert display_field("Clothes, Shoes") == "Clothes, Shoes"
+
+
+def test_spaced_separators_still_split():
+    assert canonical_field("Private Products - الكترونيات") == canonical_field("private products – إلكترونيات")
+    assert display_field("Private Products - electronics") == "Private Products - إلكترونيات"
+    assert display_field("Offline Business | E-Commerce") == "Offline Business - تجارة إلكترونية"
@@ -0,0 +1,19 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+
+def test_load_table_without_writable_cache_dir(tmp_path, monkeypatch):
+    import data_store
+
+    source = tmp_path / "clients.csv"
+    pd.DataFrame({"Category": ["عطور"], "SubCategory": ["رجالي"]}).to_csv(source, index=False)
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    # فولدر الكاش مش ممكن يتعمل (مساره تحت ملف عادي)
+    monkeypatch.setattr(data_store, "DATA_CACHE_DIR", str(blocker / "cache"))
+    monkeypatch.setattr(data_store, "_tables", {})
+
+    table = data_store.load_table(str(source))
+
+    assert list(table["Category"]) == ["عطور"]
@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("openpyxl")
+
+from ingest import iter_chunks, read_upload  # noqa: E402
+from kpi import BUDGET_COL, ORDERS_COL, PRICE_COL, VISITS_COL, compute_kpis  # noqa: E402
+
+COLUMNS = ["Client", PRICE_COL, BUDGET_COL, ORDERS_COL, VISITS_COL]
+
+
+def _xlsx(df):
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    buf.seek(0)
+    return buf
+
+
+@pytest.mark.parametrize("name", ["clients.csv", "clients.xlsx"])
+def test_header_only_upload_keeps_columns(name):
+    empty = pd.DataFrame(columns=COLUMNS)
+
+    def source():
+        return io.BytesIO(empty.to_csv(index=False).encode()) if name.endswith(".csv") else _xlsx(empty)
+
+    df = read_upload(source(), name)
+
+    assert list(df.columns) == COLUMNS
+    assert df.empty
+    assert list(iter_chunks(source(), name)) == []
+    compute_kpis(df)   # من غير KeyError
+
+
+def test_read_upload_keeps_row_order_across_chunks():
+    df = pd.DataFrame({"Client": list("abcde"), PRICE_COL: range(5)})
+    data = df.to_csv(index=False).encode()
+
+    chunks = list(iter_chunks(io.BytesIO(data), "clients.csv", chunk_rows=2))
+    loaded = read_upload(io.BytesIO(data), "clients.csv")
+
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert loaded["Client"].tolist() == list("abcde")
+    assert loaded.index.tolist() == list(range(5))
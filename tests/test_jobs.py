@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("openpyxl")
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    # بروسيس الـ worker (spawn) بيقرا نفس الإعدادات من الـ environment
+    monkeypatch.setenv("BULK_JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setenv("BULK_JOURNAL_DIR", str(tmp_path / "journals"))
+    monkeypatch.setenv("AI_CACHE_PATH", str(tmp_path / "ai_cache.sqlite3"))
+    import jobs as module
+    import journal
+
+    monkeypatch.setattr(module, "JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(journal, "JOURNAL_DIR", str(tmp_path / "journals"))
+    monkeypatch.setattr(module, "_pool", None)
+    monkeypatch.setattr(module, "_futures", {})
+    yield module
+    if module._pool is not None:
+        module._pool.shutdown(wait=True)
+
+
+def test_submit_job_runs_to_completion(jobs):
+    from kpi import compute_kpis
+
+    df_clients = compute_kpis(pd.DataFrame({
+        "المجال": ["عطور", "ملابس"],
+        "سعر المنتج": [100, 200],
+        "الميزانية الإعلانية": [1000, 0],
+        "عدد الأوردرات": [10, 5],
+        "عدد الزيارات": [1000, 300],
+    }))
+
+    job_id = jobs.submit_job(df_clients, "a" * 64, "categories", file_name="clients.xlsx", max_workers=2)
+
+    status = jobs.read_status(job_id)
+    assert status["job_id"] == job_id
+    assert status["total"] == 2
+    jobs._futures[job_id].result(timeout=120)
+    status = jobs.read_status(job_id)
+    assert status["state"] == "done", status.get("error")
+    assert jobs.job_output(job_id)
+
+
+
+def test_list_jobs_only_returns_requested_ids(jobs):
+    for job_id in ("mine", "other"):
+        os.makedirs(jobs._job_dir(job_id))
+        jobs._write_status(job_id, job_id=job_id, state="done", created=0)
+
+    assert [s["job_id"] for s in jobs.list_jobs(["mine"])] == ["mine"]
+
+
+def test_cleanup_jobs_removes_old_jobs(jobs):
+    os.makedirs(jobs._job_dir("old"))
+    jobs._write_status("old", job_id="old", state="done", created=0)
+    os.makedirs(jobs._job_dir("new"))
+    jobs._write_status("new", job_id="new", state="done", created=0)
+    status = dict(jobs.read_status("old"), updated=0)
+    with open(os.path.join(jobs._job_dir("old"), "status.json"), "w", encoding="utf-8") as f:
+        json.dump(status, f)
+
+    jobs.cleanup_jobs(max_age_days=1)
+
+    assert jobs.read_status("old") is None
+    assert jobs.read_status("new") is not None
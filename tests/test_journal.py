@@ -0,0 +1,26 @@
+import os
+
+import journal
+from journal import BulkJournal, prune_journals
+
+
+def test_journal_is_scoped_to_the_cache_bucket(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "date_bucket", lambda: "2026-10-17")
+    old = BulkJournal("abc", "rows", directory=str(tmp_path))
+    old.append(0, {"Error": ""})
+
+    monkeypatch.setattr(journal, "date_bucket", lambda: "2026-10-18")
+    assert BulkJournal("abc", "rows", directory=str(tmp_path)).load() == {}
+
+
+def test_prune_journals_removes_expired_files(tmp_path):
+    stale = tmp_path / "old.rows.2026-01-01.jsonl"
+    fresh = tmp_path / "new.rows.2026-10-18.jsonl"
+    stale.write_text("{}\n")
+    fresh.write_text("{}\n")
+    os.utime(stale, (0, 0))
+
+    prune_journals(str(tmp_path), max_age=3600)
+
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,201 @@
+import atexit
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# ===================== إعدادات تتبع زمن المراحل =====================
+TRACE_PATH = os.getenv("TRACE_PATH", ".traces.jsonl")
+# كتابة الـ spans في ملف JSONL (للتحقيق في البطء بس؛ توقيت المراحل في الـ sidebar شغال من غيرها)
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "0") == "1"
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 20 * 1024 * 1024))   # بعدها الملف بيتنقل لـ .1 ويبدأ من جديد
+TRACE_BUFFER_SPANS = int(os.getenv("TRACE_BUFFER_SPANS", 500))          # الـ spans بتتكتب على دفعات
+
+_stack = contextvars.ContextVar("trace_stack", default=())   # الـ spans المفتوحة في الـ thread ده
+_write_lock = threading.Lock()
+_buffer = []
+_profile_lock = threading.Lock()
+_active_profiler = None
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, attrs):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self._perf = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []          # كل الـ spans اللي خلصت تحت الـ trace (للجذر بس)
+
+    def record(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+
+def _flush_locked():
+    if not _buffer:
+        return
+    if os.path.exists(TRACE_PATH) and os.path.getsize(TRACE_PATH) >= TRACE_MAX_BYTES:
+        os.replace(TRACE_PATH, TRACE_PATH + ".1")
+    with open(TRACE_PATH, "a", encoding="utf-8") as f:
+        f.write("\n".join(_buffer) + "\n")
+    _buffer.clear()
+
+
+def flush():
+    """كتابة الـ spans اللي في الـ buffer على الملف (بتتنادي مع آخر كل trace وعند الخروج)"""
+    with _write_lock:
+        _flush_locked()
+
+
+atexit.register(flush)
+
+
+def _write(record):
+    if not TRACE_ENABLED:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _write_lock:
+        _buffer.append(line)
+        if len(_buffer) >= TRACE_BUFFER_SPANS:
+            _flush_locked()
+
+
+def _finish(s):
+    s.duration_ms = (time.perf_counter() - s._perf) * 1000
+    stack = _stack.get()
+    root = stack[0] if stack else None
+    if root is not None and root is not s:
+        root.spans.append(s)
+    _write(s.record())
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    قياس زمن مرحلة: with span("json.parse"): ...
+    الـ span بيتسجل تحت الـ trace الحالي (لو فيه) وبيتكتب في ملف الـ traces.
+    """
+    stack = _stack.get()
+    parent = stack[-1] if stack else None
+    s = Span(name, parent.trace_id if parent else None, parent.id if parent else None, attrs)
+    token = _stack.set(stack + (s,))
+    try:
+        yield s
+    finally:
+        _stack.reset(token)
+        _finish(s)
+
+
+def traced(name):
+    """نفس span لكن كـ decorator على دالة"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_attrs(**attrs):
+    """إضافة بيانات للـ span المفتوح حاليًا (مثلاً عدد التوكنز من رد الموديل)"""
+    stack = _stack.get()
+    if stack:
+        stack[-1].attrs.update(attrs)
+
+
+def start_trace(name, **attrs):
+    """بداية trace جديد (مثلاً rerun كامل)؛ أي span بعد كده في نفس الـ thread بيتسجل تحته"""
+    root = Span(name, uuid.uuid4().hex[:16], None, attrs)
+    root.trace_id = root.id
+    _stack.set((root,))
+    return root
+
+
+def end_trace(root):
+    _stack.set(())
+    root.duration_ms = (time.perf_counter() - root._perf) * 1000
+    _write(root.record())
+    if TRACE_ENABLED:
+        flush()
+    return root
+
+
+def stage_breakdown(root):
+    """
+    الزمن لكل مرحلة (مجمّع بالاسم): إجمالي وعدد مرات وزمن ذاتي
+    (الذاتي = من غير الـ spans اللي جواه، عشان زمن الرسم جوه الـ stream ما يتحسبش على الموديل).
+    """
+    children = {}
+    for s in root.spans:
+        children[s.parent_id] = children.get(s.parent_id, 0.0) + s.duration_ms
+    stages = {}
+    for s in root.spans:
+        stage = stages.setdefault(s.name, {"stage": s.name, "count": 0, "total_ms": 0.0, "self_ms": 0.0})
+        stage["count"] += 1
+        stage["total_ms"] += s.duration_ms
+        stage["self_ms"] += s.duration_ms - children.get(s.id, 0.0)
+        for key in ("prompt_tokens", "output_tokens", "total_tokens"):
+            if key in s.attrs:
+                stage[key] = stage.get(key, 0) + (s.attrs[key] or 0)
+    return sorted(stages.values(), key=lambda x: x["self_ms"], reverse=True)
+
+
+# ===================== Profiler =====================
+def stop_active_profile():
+    """
+    إيقاف أي profiler لسه شغال من rerun اتقطع في النص (RerunException / StopException قبل stop_profile).
+    من غير كده الـ hook بيفضل متركب، وفي Python 3.12+ أي enable() بعده بيفشل.
+    """
+    global _active_profiler
+    with _profile_lock:
+        if _active_profiler is not None:
+            _active_profiler.disable()
+            _active_profiler = None
+
+
+def start_profile():
+    global _active_profiler
+    stop_active_profile()
+    profiler = cProfile.Profile()
+    with _profile_lock:
+        profiler.enable()
+        _active_profiler = profiler
+    return profiler
+
+
+def stop_profile(profiler, top=25):
+    """إيقاف الـ profiler وترجيع أتقل الدوال (حسب الزمن التراكمي)"""
+    global _active_profiler
+    with _profile_lock:
+        profiler.disable()
+        if _active_profiler is profiler:
+            _active_profiler = None
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": nc,
+            "self_ms": tt * 1000,
+            "cumulative_ms": ct * 1000,
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:top]
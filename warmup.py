@@ -0,0 +1,132 @@
+"""
+تسخين كاش الـ Benchmarks بعد الـ deploy أو مع بداية سلة زمنية جديدة،
+عشان أول مستخدم في تبويبات 3 و 4 ما يستناش رد الموديل.
+
+بيجمع كل المجالات من ملف العملاء: كل Category و SubCategory وكل زوج (Category - SubCategory) موجود في البيانات،
+وكمان نفس المجالات بالصيغة اللي التبويبين بيبنوها ("Private Products - ..." و "Offline Business - ...")،
+وبعدين بيجيب الـ Benchmarks بتاعتها بالتوازي تحت rate limit وبيخزنها في الكاش المشترك.
+
+    python warmup.py                         # كل المجالات بالإعدادات الافتراضية
+    python warmup.py --workers 8 --rate 2    # 8 طلبات متوازية وبحد أقصى 2 طلب في الثانية
+    python warmup.py --all-pairs --dry-run   # كل تركيبات Category × SubCategory، عرض بس من غير طلبات
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ai_service import known_benchmarks, resolve_benchmarks
+from arabic_text import canonical_field
+from data_store import load_table
+from resilience import RateLimiter
+from tracing import span
+
+# ===================== إعدادات التسخين =====================
+WARMUP_CLIENTS_PATH = os.getenv("WARMUP_CLIENTS_PATH", "ClientsData_with_SubCategory.xlsx")
+WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", 4))
+WARMUP_RATE = float(os.getenv("WARMUP_RATE", 1.0))          # طلبات للموديل في الثانية
+# نفس البادئات اللي تبويب 3 (Private Products) وتبويب 4 (Offline Business) بيبنوا بيها المجال
+TAB_PREFIXES = ("Private Products", "Offline Business")
+
+
+def _values(table, column):
+    if column not in table.columns:
+        return []
+    return [str(v).strip() for v in table[column].dropna().unique() if str(v).strip()]
+
+
+def field_variants(table, all_pairs=False):
+    """
+    كل المجالات اللي ممكن تتطلب لها Benchmarks، من غير تكرار (بالمفتاح الموحد).
+    all_pairs: كل تركيبات Category × SubCategory (التبويبات بتسمح بأي تركيبة) بدل الأزواج الموجودة في البيانات بس.
+    """
+    categories = _values(table, "Category")
+    subcategories = _values(table, "SubCategory")
+    if all_pairs:
+        pairs = [(c, s) for c in categories for s in subcategories]
+    elif {"Category", "SubCategory"} <= set(table.columns):
+        observed = table[["Category", "SubCategory"]].dropna().drop_duplicates()
+        pairs = [(str(c).strip(), str(s).strip()) for c, s in zip(observed["Category"], observed["SubCategory"])]
+    else:
+        pairs = []
+
+    bases = categories + subcategories + [f"{c} - {s}" for c, s in pairs]
+    fields = list(bases)
+    for prefix in TAB_PREFIXES:
+        fields.append(prefix)
+        fields.extend(f"{prefix} - {base}" for base in bases)
+
+    seen, unique = set(), []
+    for field in fields:
+        key = canonical_field(field)
+        if key not in seen:
+            seen.add(key)
+            unique.append(field)
+    return unique
+
+
+def warm(fields, workers=WARMUP_WORKERS, rate=WARMUP_RATE):
+    """
+    resolve_benchmarks لكل مجال؛ المجالات اللي في الجدول أو الكاش بتخلص فورًا،
+    والباقي بيروح للموديل بالتوازي بحد أقصى rate طلب في الثانية.
+    بيرجع {المستوى: العدد} و {المجال: الخطأ} للي فشلوا.
+    """
+    limiter = RateLimiter(rate, burst=workers)
+    tiers, errors = {}, {}
+    cold = []
+    for field in fields:
+        _, tier = known_benchmarks(field)
+        if tier is None:
+            cold.append(field)
+        else:
+            tiers[tier] = tiers.get(tier, 0) + 1
+
+    def fetch(field):
+        limiter.acquire()
+        return resolve_benchmarks(field)[1]
+
+    with span("warmup", fields=len(fields), cold=len(cold)):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(fetch, field): field for field in cold}
+            for done, future in enumerate(as_completed(futures), 1):
+                field = futures[future]
+                try:
+                    tier = future.result()
+                except Exception as e:
+                    errors[field] = str(e)
+                    print(f"  [{done}/{len(cold)}] ✗ {field}: {e}")
+                    continue
+                tiers[tier] = tiers.get(tier, 0) + 1
+                print(f"  [{done}/{len(cold)}] ✓ {field}")
+    return tiers, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="تسخين كاش الـ Benchmarks لكل مجالات ملف العملاء")
+    parser.add_argument("--input", default=WARMUP_CLIENTS_PATH, help="ملف العملاء (Category / SubCategory)")
+    parser.add_argument("--workers", type=int, default=WARMUP_WORKERS, help="عدد الطلبات المتوازية")
+    parser.add_argument("--rate", type=float, default=WARMUP_RATE, help="أقصى عدد طلبات للموديل في الثانية")
+    parser.add_argument("--all-pairs", action="store_true", help="كل تركيبات Category × SubCategory")
+    parser.add_argument("--dry-run", action="store_true", help="عرض المجالات بس من غير طلبات")
+    args = parser.parse_args(argv)
+
+    fields = field_variants(load_table(args.input), all_pairs=args.all_pairs)
+    print(f"{len(fields)} مجال من {args.input}")
+    if args.dry_run:
+        for field in fields:
+            _, tier = known_benchmarks(field)
+            print(f"  {tier or 'cold':>5}  {field}")
+        return
+
+    start = time.perf_counter()
+    tiers, errors = warm(fields, workers=args.workers, rate=args.rate)
+    print(f"\nخلص في {time.perf_counter() - start:.1f} ثانية")
+    for tier in ("table", "cache", "model"):
+        print(f"  {tier:>5}: {tiers.get(tier, 0)}")
+    if errors:
+        print(f"  فشل: {len(errors)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()